@@ -1 +1,7 @@
-from .appmainwindow import AppMainWindow
+def __getattr__(name: str):
+    # keeps the Qt-free modules importable without PyQt6/dlib/mysql
+    if name == "AppMainWindow":
+        from .appmainwindow import AppMainWindow
+
+        return AppMainWindow
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
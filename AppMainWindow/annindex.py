@@ -0,0 +1,125 @@
+import numpy as np
+
+
+def _sqdistances(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    dist = a @ b.T
+    dist *= -2
+    dist += np.einsum("ij,ij->i", b, b)
+    dist += np.einsum("ij,ij->i", a, a)[:, None]
+    return np.maximum(dist, 0, out=dist)
+
+
+class IVFIndex:
+    # inverted file index: rows are bucketed under their nearest k-means centroid
+    # and a query only scans the `nprobe` buckets closest to it.
+    # `nprobe` is the recall/latency knob, nprobe == nlist is an exact search.
+
+    def __init__(
+        self,
+        nlist: int | None = None,
+        nprobe: int = 8,
+        minSize: int = 10000,
+        iterations: int = 10,
+        seed: int = 0,
+    ) -> None:
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.minSize = minSize
+        self.iterations = iterations
+        self.seed = seed
+
+        self.centroids = None
+        self.lists = []
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    def reset(self) -> None:
+        self.centroids = None
+        self.lists = []
+
+    @property
+    def stateKey(self) -> str:
+        # a saved state only fits an index configured the same way
+        return f"ivf:{self.nlist}"
+
+    def state(self) -> dict | None:
+        # centroids and every row's bucket, enough to skip k-means on load
+        if not self.trained:
+            return None
+        labels = np.empty(sum(len(rows) for rows in self.lists), dtype=np.int32)
+        for label, rows in enumerate(self.lists):
+            labels[rows] = label
+        return {"centroids": self.centroids, "labels": labels}
+
+    def restore(self, state: dict, size: int) -> bool:
+        centroids, labels = state["centroids"], np.asarray(state["labels"])
+        if len(labels) != size:
+            return False
+        order = np.argsort(labels, kind="stable")
+        bounds = np.searchsorted(labels[order], np.arange(len(centroids) + 1))
+        self.centroids = np.array(centroids)
+        self.lists = [order[bounds[i] : bounds[i + 1]] for i in range(len(centroids))]
+        return True
+
+    def _assign(self, encodings: np.ndarray) -> np.ndarray:
+        return np.argmin(_sqdistances(encodings, self.centroids), axis=1)
+
+    def train(self, encodings: np.ndarray, names: np.ndarray | None = None) -> None:
+        n = len(encodings)
+        if n < self.minSize:
+            self.reset()
+            return
+
+        nlist = self.nlist or max(int(4 * np.sqrt(n)), 1)
+        nlist = min(nlist, n)
+        rng = np.random.default_rng(self.seed)
+        sample = encodings[rng.choice(n, min(n, 32 * nlist), replace=False)]
+
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+        for _ in range(self.iterations):
+            labels = np.argmin(_sqdistances(sample, centroids), axis=1)
+            order = np.argsort(labels, kind="stable")
+            filled, starts, counts = np.unique(
+                labels[order], return_index=True, return_counts=True
+            )
+            sums = np.add.reduceat(sample[order], starts, axis=0)
+            centroids[filled] = sums / counts[:, None]
+
+        self.centroids = centroids
+        self.lists = [np.empty(0, dtype=np.int64) for _ in range(nlist)]
+        self.add(encodings, 0)
+
+    def add(
+        self,
+        encodings: np.ndarray,
+        start: int,
+        names: np.ndarray | None = None,
+        allEncodings: np.ndarray | None = None,
+    ) -> None:
+        if not self.trained:
+            return
+        labels = self._assign(encodings)
+        rows = np.arange(start, start + len(encodings))
+        for label in np.unique(labels):
+            self.lists[label] = np.concatenate(
+                (self.lists[label], rows[labels == label])
+            )
+
+    def remove(self, keep: np.ndarray, allEncodings: np.ndarray | None = None) -> None:
+        # `keep` masks the gallery rows before compaction, surviving rows shift down
+        if not self.trained:
+            return
+        newRows = np.cumsum(keep) - 1
+        self.lists = [newRows[rows[keep[rows]]] for rows in self.lists]
+
+    def probe(self, queries: np.ndarray, widen: int = 1) -> list:
+        # widen multiplies nprobe, e.g. for a second look at faces that missed
+        nprobe = min(self.nprobe * widen, len(self.centroids))
+        dist = _sqdistances(queries, self.centroids)
+        if nprobe < len(self.centroids):
+            nearest = np.argpartition(dist, nprobe - 1, axis=1)[:, :nprobe]
+        else:
+            nearest = np.broadcast_to(np.arange(nprobe), dist.shape)
+        return [np.concatenate([self.lists[i] for i in labels]) for labels in nearest]
@@ -10,31 +10,50 @@ from PyQt6.QtWidgets import (
     QLabel,
     QLineEdit,
     QFileDialog,
-    QTableWidgetItem,
+    QTableView,
+    QGridLayout,
+    QSizePolicy,
 )
-from PyQt6.QtGui import QImage, QPixmap, QMouseEvent, QHideEvent
-from PyQt6.QtCore import QTimer, Qt
+from PyQt6.QtGui import (
+    QMouseEvent,
+    QHideEvent,
+    QShowEvent,
+    QShortcut,
+    QKeySequence,
+)
+from PyQt6.QtCore import QTimer, Qt, pyqtSignal
 from .ui_mainwindow import Ui_MainWindow
 from .ui_addwindow import Ui_Widget as Ui_AddWindow
 from .ui_deletewindow import Ui_Widget as Ui_DeleteWindow
-
-from mysql.connector import connect
-import face_recognition as fr
+from .detection import (
+    fitScale,
+    resizeFrame,
+    warmUp,
+)
+from .rendering import FrameRing, FrameView
+from .pipeline import FrameGrabber, RecognitionWorker
+from .tracking import FaceTracker
+from .motion import MotionGate
+from .controller import ScaleController
+from .engine import FaceEngine
+from .cache import DetectionCache, contentKey
+from .events import EventLog
+from .facetable import FaceTableModel
+from .store import FaceStore, MySQLFaceStore
+from .metrics import Metrics, serveMetrics
+
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from functools import partial
+from threading import Thread
+from time import perf_counter
+import multiprocessing as mp
+import math
+import traceback
+import os
 import numpy as np
 import cv2 as cv
 
 
-def cvMatToQImage(inMat: cv.Mat) -> QImage:
-    height, width, channel = inMat.shape
-    bytesPerLine = 3 * width
-    qImg = QImage(inMat.data, width, height, bytesPerLine, QImage.Format.Format_RGB888)
-    return qImg.rgbSwapped()
-
-
-def cvMatToQPixmap(inMat: cv.Mat) -> QPixmap:
-    return QPixmap.fromImage(cvMatToQImage(inMat))
-
-
 class AddWindow(QWidget, Ui_AddWindow):
     def __init__(self) -> None:
         super().__init__()
@@ -60,44 +79,184 @@ class DeleteWindow(QWidget, Ui_DeleteWindow):
     def _init(self) -> None:
         self.cancelBtn.clicked.connect(self.hide)
 
+        # the generated table widget is replaced by a view on a paged model
+        self.deleteTable.hide()
+        geometry = self.deleteTable.geometry()
+        self.searchEdit = QLineEdit(self)
+        self.searchEdit.setPlaceholderText("Search name")
+        self.searchEdit.setGeometry(geometry.x(), geometry.y(), geometry.width(), 30)
+        self.faceView = QTableView(self)
+        self.faceView.setGeometry(geometry.adjusted(0, 36, 0, 0))
+        self.faceView.verticalHeader().setVisible(False)
+        self.faceView.horizontalHeader().setStretchLastSection(True)
+
+        # searching waits until typing pauses
+        self.searchTimer = QTimer(self)
+        self.searchTimer.setSingleShot(True)
+        self.searchTimer.setInterval(300)
+        self.searchEdit.textChanged.connect(lambda _: self.searchTimer.start())
+
 
 class AppMainWindow(QMainWindow, Ui_MainWindow):
+    # startup stages finishing on other threads
+    stageReady = pyqtSignal(str)
+    startupFailed = pyqtSignal(str)
+
     def __init__(
         self,
-        filenameOrIndex: str | int = 0,
+        filenameOrIndex: str | int | list = 0,
         host: str = "localhost",
         user: str = "root",
         password: str = "abcd1234",
+        detectEvery: int = 5,
+        motionGate: bool = True,
+        latencyBudget: float | None = None,
+        upsample: tuple[int, int] = (0, 1),
+        jitters: tuple[int, int] = (1, 1),
+        minQuality: float = 0.3,
+        prototypes: str | None = None,
+        shards: int = 0,
+        nprobe: int = 8,
+        detectionWorkers: int | None = None,
+        encodingFormat: str = "float32",
+        migrate: bool = False,
+        snapshotDir: str | None = os.path.expanduser("~/.face_recognition_app"),
+        cacheFile: str | None = os.path.expanduser(
+            "~/.face_recognition_app/detections.sqlite"
+        ),
+        store: FaceStore | None = None,
+        metricsOverlay: bool = False,
+        metricsFile: str | None = None,
+        metricsPort: int | None = None,
+        eventLog: bool = True,
+        eventRetentionDays: float | None = 30,
+        startedAt: float | None = None,
     ) -> None:
         super().__init__()
-
-        self.cam = cv.VideoCapture(filenameOrIndex)
-        self.db = connect(host=host, user=user, password=password)
-        self.cr = self.db.cursor()
-
-        self.timer = QTimer(self)
+        # perf_counter() when the process started, startup stages are timed from it
+        self.startedAt = perf_counter() if startedAt is None else startedAt
+        self.startup = {}
+        self.camerasOpened = 0
+        self.startupError = None
+
+        self.metrics = Metrics()
+        self.metricsOverlay = metricsOverlay
+        self.metricsFile = metricsFile
+        self.metricsTimer = QTimer(self)
+        self.metricsServer = None
+        if metricsPort is not None:
+            self.metricsServer = serveMetrics(self.metrics, metricsPort)
+
+        sources = filenameOrIndex
+        if not isinstance(sources, list):
+            sources = [sources]
+        self.grabbers = [FrameGrabber(source, self.metrics) for source in sources]
+        # database writes never run on the GUI thread
+        self.writer = ThreadPoolExecutor(1)
+
+        # dlib holds the GIL, so detection runs in worker processes that load
+        # the models once and are shared by every camera. Each camera has at
+        # most one frame in flight, so the pool's FIFO queue serves them in turn.
+        # One process per core, so the faces of a crowded frame can be encoded
+        # on all of them even with a single camera
+        if detectionWorkers is None:
+            detectionWorkers = os.cpu_count() or 1
+        self.detectionWorkers = detectionWorkers
+        self.executor = ProcessPoolExecutor(
+            detectionWorkers, mp_context=mp.get_context("spawn"), initializer=warmUp
+        )
+        # MySQL is only connected to by engine.prepare on the writer thread,
+        # which also migrates the stored encodings to encodingFormat if asked
+        self.migrate = migrate
+        self.engine = FaceEngine(
+            store or MySQLFaceStore(host, user, password),
+            encodingFormat,
+            snapshotDir,
+            self.executor,
+            self.metrics,
+            prototypes=prototypes,
+            shards=shards,
+            nprobe=nprobe,
+            cache=DetectionCache(cacheFile) if cacheFile else None,
+        )
+        self.store, self.gallery = self.engine.store, self.engine.gallery
+        self.faceModel = FaceTableModel(self.store)
+        self.events = None
+        if eventLog:
+            self.events = EventLog(
+                self.store, self.metrics, retentionDays=eventRetentionDays
+            )
+        self.workers = [
+            RecognitionWorker(
+                grabber,
+                self.gallery.matchWithDistances,
+                self.executor,
+                FaceTracker(detectEvery) if (detectEvery > 1) else None,
+                self.metrics,
+                MotionGate() if motionGate else None,
+                (
+                    ScaleController(latencyBudget, upsample=upsample, jitters=jitters)
+                    if latencyBudget
+                    else None
+                ),
+                minQuality,
+                self.events,
+                detectionWorkers,
+            )
+            for grabber in self.grabbers
+        ]
         self.maxVideo = QLabel()
         self.addWindow = AddWindow()
         self.delWindow = DeleteWindow()
+        self.frames = [FrameRing() for _ in sources]
+        self.maxCamera = 0
 
-        self.known_face_encodings = []
-        self.known_face_names = []
         self.uknown_faces = []
 
+        self.videoRunning = False
+        self.live_locations = [[] for _ in sources]
+        self.live_names = [[] for _ in sources]
+        self.live_scale = [1.0 for _ in sources]
+
         self.face_locations = []
         self.face_encodings = []
         self.face_names = []
+        self.face_scores = []
         self.frame = None
 
         self.setupUi(self)
+        self.videoView = FrameView(self.videoLabel, self.metrics)
+        self.maxView = FrameView(self.maxVideo, self.metrics)
+        self.addView = FrameView(self.addWindow.imageLabel, self.metrics)
+        self.tiles = []
+        if len(sources) > 1:
+            self._initGrid(len(sources))
         self._init()
 
+    def _initGrid(self, count: int) -> None:
+        # the video label becomes a container for one tile per camera
+        columns = math.ceil(math.sqrt(count))
+        grid = QGridLayout(self.videoLabel)
+        grid.setContentsMargins(0, 0, 0, 0)
+        grid.setSpacing(2)
+        for camera in range(count):
+            label = QLabel(self.videoLabel)
+            label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+            label.setSizePolicy(QSizePolicy.Policy.Ignored, QSizePolicy.Policy.Ignored)
+            label.mouseDoubleClickEvent = partial(
+                self.videoLabel_doubleClicked, camera=camera
+            )
+            grid.addWidget(label, camera // columns, camera % columns)
+            self.tiles.append(FrameView(label, self.metrics))
+
     def _init(self) -> None:
         self.videoLabel.setAlignment(Qt.AlignmentFlag.AlignCenter)
         self.maxVideo.setAlignment(Qt.AlignmentFlag.AlignCenter)
 
         self.maxVideo.resize(600, 500)
-        self.timer.timeout.connect(self.readCamera)
+        for camera, (grabber, worker) in enumerate(zip(self.grabbers, self.workers)):
+            grabber.frameReady.connect(partial(self.readCamera, camera))
+            worker.resultsReady.connect(partial(self.worker_resultsReady, camera))
         self.addBtn.clicked.connect(self.addBtn_clicked)
         self.deleteBtn.clicked.connect(self.deleteBtn_clicked)
         self.maxVideo.setStyleSheet("background: rgb(150, 150, 150);")
@@ -111,212 +270,270 @@ class AppMainWindow(QMainWindow, Ui_MainWindow):
         self.addWindow.browseProceedBtn.clicked.connect(self.browseProceedBtn_clicked)
 
         self.delWindow.okBtn.clicked.connect(self.delWindow_okBtn_clicked)
-        self.delWindow.deleteTable.setColumnCount(3)
-        self.delWindow.deleteTable.setRowCount(0)
-        self.delWindow.deleteTable.verticalHeader().setVisible(False)
+        self.delWindow.faceView.setModel(self.faceModel)
+        self.delWindow.searchTimer.timeout.connect(self.delWindow_search)
 
         self.videoLabel.mouseDoubleClickEvent = self.videoLabel_doubleClicked
         self.maxVideo.mouseDoubleClickEvent = lambda ev: self.maxVideo.hide()
         self.addWindow.hideEvent = self.addWindow_hideEvent
         self.delWindow.hideEvent = self.delWindow_hideEvent
 
-        self.prepareDatabase()
-        self.loadData()
-        self.timer.start(2)
-
-    def addWindow_hideEvent(self, ev: QHideEvent) -> None:
-        self.timer.start(2)
-        for face in self.uknown_faces:
-            face.close()
-        self.setEnabled(True)
-        self.addWindow.imageLabel.clear()
-        self.addWindow.okBtn.setEnabled(False)
-        self.addWindow.proceedBtn.setEnabled(False)
-        self.addWindow.browseProceedBtn.setEnabled(False)
-
-    def delWindow_hideEvent(self, ev: QHideEvent) -> None:
-        self.timer.start(2)
-        self.setEnabled(True)
-        self.delWindow.deleteTable.clear()
-        self.delWindow.deleteTable.setRowCount(0)
-
-    def prepareDatabase(self) -> None:
-        self.cr.execute("CREATE DATABASE IF NOT EXISTS face_recognition_app")
-        self.db.connect(database="face_recognition_app")
-        self.cr.execute(
-            "CREATE TABLE IF NOT EXISTS known_faces (id INT AUTO_INCREMENT PRIMARY KEY, name TEXT, encoding BLOB)"
+        shortcut = QShortcut(QKeySequence("F3"), self)
+        shortcut.setContext(Qt.ShortcutContext.ApplicationShortcut)
+        shortcut.activated.connect(self.toggleMetricsOverlay)
+        if self.metricsFile is not None:
+            self.metricsTimer.timeout.connect(self.exportMetrics)
+            self.metricsTimer.start(10000)
+
+        # the window shows at once: cameras open on their grabber threads, the
+        # detection processes load and warm up the models and the gallery loads
+        # on the writer thread. Recognition starts once the gallery is there
+        self.stageReady.connect(self._stageReady)
+        self.startupFailed.connect(self._startupFailed)
+        self.addBtn.setEnabled(False)
+        self.deleteBtn.setEnabled(False)
+        self.statusBar().showMessage("Loading face models and gallery...")
+        for camera, grabber in enumerate(self.grabbers):
+            grabber.opened.connect(partial(self.grabber_opened, camera))
+            grabber.start()
+        warmUps = [self.executor.submit(warmUp) for _ in range(self.detectionWorkers)]
+        Thread(target=self._waitForModels, args=(warmUps,), daemon=True).start()
+        self.writer.submit(self.engine.prepare, self.migrate).add_done_callback(
+            self._galleryLoaded
         )
+        self.startVideo()
 
-    def loadData(self) -> None:
-        self.known_face_names.clear()
-        self.known_face_encodings.clear()
-        self.cr.execute("SELECT name, encoding FROM known_faces")
-        for name, encoding in self.cr.fetchall():
-            self.known_face_names.append(name)
-            self.known_face_encodings.append(np.frombuffer(encoding))
+    def showEvent(self, event: QShowEvent) -> None:
+        super().showEvent(event)
+        # the next turn of the event loop comes after the first paint
+        if "window" not in self.startup:
+            QTimer.singleShot(0, partial(self._stageReady, "window"))
 
-    def _resize(self, img: cv.Mat, screenSize: tuple[int, int]) -> cv.Mat:
-        hi, wi = img.shape[:2]
-        ws, hs = screenSize
-        ri, rs = wi / hi, ws / hs
-
-        wn = int(wi * hs / hi) if (rs > ri) else ws
-        hn = hs if (rs > ri) else int(hi * ws / wi)
-        wn, hn = max(wn, 1), max(hn, 1)
-
-        if (wn * hn) < (wi * hi):
-            return cv.resize(img, (wn, hn), interpolation=cv.INTER_AREA)
+    def _waitForModels(self, futures: list) -> None:
+        wait(futures)
+        if any(f.cancelled() for f in futures):
+            return
+        errors = [f.exception() for f in futures if f.exception() is not None]
+        if errors:
+            traceback.print_exception(errors[0])
+            self.startupFailed.emit(f"Face models failed to load: {errors[0]}")
         else:
-            return cv.resize(img, (wn, hn), interpolation=cv.INTER_LINEAR)
+            self.stageReady.emit("models")
 
-    def _detectFaces(self, img: cv.Mat, scale: float = 0.7) -> tuple[list, list, list]:
-        small_frame = cv.resize(
-            img, (0, 0), fx=scale, fy=scale, interpolation=cv.INTER_AREA
-        )
-        small_frame = cv.cvtColor(small_frame, cv.COLOR_BGR2RGB)
-        face_locations = fr.face_locations(small_frame)
-        face_encodings = fr.face_encodings(small_frame, face_locations)
+    def _galleryLoaded(self, future: Future) -> None:
+        if future.exception() is not None:
+            traceback.print_exception(future.exception())
+            self.startupFailed.emit(f"Gallery failed to load: {future.exception()}")
+        else:
+            self.stageReady.emit("gallery")
 
-        if self.known_face_names:
-            face_names = []
+    def grabber_opened(self, camera: int, ok: bool) -> None:
+        if not ok:
+            self.startupFailed.emit(f"Camera {camera + 1} could not be opened")
+            return
+        self.camerasOpened += 1
+        if self.camerasOpened == len(self.grabbers):
+            self._stageReady("cameras")
+
+    def _startupFailed(self, message: str) -> None:
+        # stays in the status bar, later stages do not replace it
+        self.startupError = message
+        self.statusBar().showMessage(message)
+
+    def _stageReady(self, stage: str) -> None:
+        # seconds since startedAt, also exported as startup_<stage>_s gauges
+        if stage in self.startup:
+            return
+        self.startup[stage] = perf_counter() - self.startedAt
+        self.metrics.set(f"startup_{stage}_s", round(self.startup[stage], 3))
+
+        if stage == "gallery":
+            for worker in self.workers:
+                worker.start()
+            self.addBtn.setEnabled(True)
+            self.deleteBtn.setEnabled(True)
+
+        waiting = [
+            label
+            for key, label in (("models", "face models"), ("gallery", "gallery"))
+            if key not in self.startup
+        ]
+        if self.startupError is not None:
+            return
+        if stage == "first_recognition":
+            print(
+                "startup: "
+                + ", ".join(f"{key} {t:.2f}s" for key, t in self.startup.items())
+            )
+            self.statusBar().showMessage(
+                f"Ready, first recognition after {self.startup[stage]:.1f}s", 10000
+            )
+        elif waiting:
+            self.statusBar().showMessage(f"Loading {' and '.join(waiting)}...")
+        elif "first_recognition" not in self.startup:
+            self.statusBar().showMessage("Waiting for the first recognition...")
 
-            for face_encoding in face_encodings:
-                name = "Unknown"
+    def toggleMetricsOverlay(self) -> None:
+        self.metricsOverlay = not self.metricsOverlay
 
-                face_distances = fr.face_distance(
-                    self.known_face_encodings, face_encoding
-                )
-                best_index = np.argmin(face_distances)
+    def exportMetrics(self) -> None:
+        self.metrics.export(self.metricsFile)
 
-                if face_distances[best_index] < 0.4:
-                    name = self.known_face_names[best_index]
-                face_names.append(name)
-        else:
-            face_names = ["Unknown" for _ in range(len(face_locations))]
+    def startVideo(self) -> None:
+        self.videoRunning = True
+        for worker in self.workers:
+            worker.enabled = True
 
-        return (face_locations, face_encodings, face_names)
+    def stopVideo(self) -> None:
+        self.videoRunning = False
+        for camera, worker in enumerate(self.workers):
+            worker.enabled = False
+            self.live_locations[camera] = []
+            self.live_names[camera] = []
 
-    def _visualize(
-        self, img: cv.Mat, face_locations: list, face_names: list, scale: float = 0.7
-    ) -> cv.Mat:
-        scale = 1 / scale
-        for (top, right, bottom, left), name in zip(face_locations, face_names):
-            top, right = int(top * scale), int(right * scale)
-            bottom, left = int(bottom * scale), int(left * scale)
+    def addWindow_hideEvent(self, ev: QHideEvent) -> None:
+        self.startVideo()
+        for face in self.uknown_faces:
+            face.close()
+        self.setEnabled(True)
+        self.addView.clear()
+        self.addWindow.okBtn.setEnabled(False)
+        self.addWindow.proceedBtn.setEnabled(False)
+        self.addWindow.browseProceedBtn.setEnabled(False)
 
-            cv.rectangle(img, (left, top), (right, bottom), (0, 0, 255), 2)
-            cv.rectangle(
-                img, (left - 1, bottom - 15), (right, bottom + 5), (0, 0, 255), -1
-            )
+    def delWindow_hideEvent(self, ev: QHideEvent) -> None:
+        self.startVideo()
+        self.setEnabled(True)
+        self.faceModel.clear()
 
-            font = cv.FONT_HERSHEY_COMPLEX_SMALL
-            cv.putText(img, name, (left - 2, bottom), font, 1, (255, 255, 255), 1)
-        return img
+    def _resize(self, img: cv.Mat, screenSize: tuple[int, int]) -> cv.Mat:
+        return resizeFrame(img, screenSize)
 
-    def _detectAndVisualizeFaces(
-        self, img: cv.Mat, scale: float = 0.7
-    ) -> tuple[list, list, list]:
-        face_locations, face_encodings, face_names = self._detectFaces(img, scale)
-        self._visualize(img, face_locations, face_names, scale)
-        return (face_locations, face_encodings, face_names)
+    def _detectFaces(
+        self, img: cv.Mat, scale: float = 0.7, key: str | None = None
+    ) -> tuple[list, list, list, list]:
+        return self.engine.recognize(img, scale, key)
 
-    def readCamera(self) -> None:
-        ret, frame = self.cam.read()
-        if not ret:
+    def readCamera(self, camera: int = 0) -> None:
+        _, rawFrame = self.grabbers[camera].latest()
+        if (not self.videoRunning) or (rawFrame is None):
             return
 
-        if not self.addWindow.isHidden():
-            frame = self._resize(
-                frame,
-                (self.addWindow.imageLabel.width(), self.addWindow.imageLabel.height()),
-            )
-            self.frame = frame.copy()
-            self._detectAndVisualizeFaces(frame)
-            self.addWindow.imageLabel.setPixmap(cvMatToQPixmap(frame))
-
-        elif not self.maxVideo.isHidden():
-            frame = self._resize(frame, (self.maxVideo.width(), self.maxVideo.height()))
-            scale = (self.videoLabel.width() * self.videoLabel.height()) / (
+        worker = self.workers[camera]
+        home = self.tiles[camera] if self.tiles else self.videoView
+        maximized = (not self.maxVideo.isHidden()) and (camera == self.maxCamera)
+        if (camera == 0) and (not self.addWindow.isHidden()):
+            view, scale = self.addView, 0.7
+        elif maximized and (worker.controller is not None):
+            # the controller shrinks the detection frame when it gets too slow
+            view, scale = self.maxView, 0.7
+        elif maximized:
+            view = self.maxView
+            scale = (home.label.width() * home.label.height()) / (
                 self.maxVideo.width() * self.maxVideo.height()
             )
             scale = min(scale * 0.7, 1)
-            self._detectAndVisualizeFaces(frame, scale)
-            self.maxVideo.setPixmap(cvMatToQPixmap(frame))
-
         else:
-            frame = self._resize(
-                frame, (self.videoLabel.width(), self.videoLabel.height())
-            )
-            self._detectAndVisualizeFaces(frame)
-            self.videoLabel.setPixmap(cvMatToQPixmap(frame))
+            view, scale = home, 0.7
+
+        screenSize = (view.label.width(), view.label.height())
+        worker.scale = fitScale(rawFrame, screenSize) * scale
+
+        with self.metrics.time("resize"):
+            frame = self.frames[camera].resize(rawFrame, screenSize)
+        if view is self.addView:
+            # nothing is drawn into the buffer, so it can be kept as it is
+            self.frame = frame
+
+        # results belong to an earlier frame detected at its own scale
+        displayScale = frame.shape[1] / rawFrame.shape[1]
+        view.setFrame(
+            frame,
+            self.live_locations[camera],
+            self.live_names[camera],
+            self.live_scale[camera] / displayScale,
+            self.metrics.overlayLines() if self.metricsOverlay else None,
+        )
+        self.metrics.increment("frames_displayed")
+
+    def worker_resultsReady(
+        self,
+        camera: int,
+        frameId: int,
+        scale: float,
+        face_locations: list,
+        face_encodings: list,
+        face_names: list,
+    ) -> None:
+        if "first_recognition" not in self.startup:
+            self._stageReady("first_recognition")
+        if not self.videoRunning:
+            return
+        self.live_scale[camera] = scale
+        self.live_locations[camera] = face_locations
+        self.live_names[camera] = face_names
 
     def addBtn_clicked(self) -> None:
         if (not self.addWindow.screenshotChoice.isChecked()) or (
             self.addWindow.platStopBtn.text() == "Play"
         ):
-            self.timer.stop()
+            self.stopVideo()
         self.addWindow.showNormal()
-        self.videoLabel.clear()
+        self.videoView.clear()
         self.setEnabled(False)
 
     def deleteBtn_clicked(self) -> None:
-        self.timer.stop()
+        self.stopVideo()
         self.delWindow.showNormal()
-        self.videoLabel.clear()
+        self.videoView.clear()
         self.setEnabled(False)
 
-        self.cr.execute("SELECT id, name FROM known_faces")
-        data = self.cr.fetchall()
-        headers = ["Id", "Name", "Delete"]
-        self.delWindow.deleteTable.setHorizontalHeaderLabels(headers)
-        self.delWindow.deleteTable.setRowCount(len(data))
+        self.delWindow_search()
 
-        for row, (id, name) in enumerate(data):
-            item0 = QTableWidgetItem(str(id))
-            self.delWindow.deleteTable.setItem(row, 0, item0)
-            item1 = QTableWidgetItem(name)
-            self.delWindow.deleteTable.setItem(row, 1, item1)
+    def delWindow_search(self) -> None:
+        self.faceModel.setSearch(self.delWindow.searchEdit.text().strip())
+        self._updateDeleteTitle()
 
-            item2 = QTableWidgetItem()
-            item2.setFlags(Qt.ItemFlag.ItemIsUserCheckable | Qt.ItemFlag.ItemIsEnabled)
-            item2.setCheckState(Qt.CheckState.Unchecked)
-            self.delWindow.deleteTable.setItem(row, 2, item2)
+    def _updateDeleteTitle(self) -> None:
+        rows, people = self.faceModel.total
+        self.delWindow.setWindowTitle(f"Delete face - {rows} samples, {people} people")
 
     def browseChoice_clicked(self) -> None:
-        self.timer.stop()
+        self.stopVideo()
         self.addWindow.browseGroup.setEnabled(True)
         self.addWindow.screenshotGroup.setEnabled(False)
         for face in self.uknown_faces:
             face.close()
-        self.addWindow.imageLabel.clear()
+        self.addView.clear()
 
     def screenshotChoice_clicked(self) -> None:
         if self.addWindow.platStopBtn.text() == "Stop":
-            self.timer.start(2)
+            self.startVideo()
         self.addWindow.screenshotGroup.setEnabled(True)
         self.addWindow.browseGroup.setEnabled(False)
         for face in self.uknown_faces:
             face.close()
-        self.addWindow.imageLabel.clear()
+        self.addView.clear()
 
     def platStopBtn_clicked(self) -> None:
         if self.addWindow.platStopBtn.text() == "Stop":
-            self.timer.stop()
+            self.stopVideo()
             self.addWindow.platStopBtn.setText("Play")
             self.addWindow.proceedBtn.setEnabled(True)
             (
                 self.face_locations,
                 self.face_encodings,
                 self.face_names,
-            ) = self._detectAndVisualizeFaces(self.frame, 1)
-            self.addWindow.imageLabel.setPixmap(cvMatToQPixmap(self.frame))
+                self.face_scores,
+            ) = self._detectFaces(self.frame, 1)
+            self.addView.setFrame(self.frame, self.face_locations, self.face_names)
         else:
-            self.timer.start(2)
+            self.startVideo()
             self.addWindow.platStopBtn.setText("Stop")
             self.addWindow.proceedBtn.setEnabled(False)
             for face in self.uknown_faces:
                 face.close()
-            self.addWindow.imageLabel.clear()
+            self.addView.clear()
 
     def _proceed(self, scale: float = 1.0) -> None:
         scale = 1 / scale
@@ -324,11 +541,24 @@ class AppMainWindow(QMainWindow, Ui_MainWindow):
         deltaX = (self.addWindow.imageLabel.width() - self.frame.shape[1]) // 2
         deltaY = (self.addWindow.imageLabel.height() - self.frame.shape[0]) // 2
 
-        for (top, right, bottom, left), name, encoding in zip(
-            self.face_locations, self.face_names, self.face_encodings
-        ):
-            if self.known_face_names.count(name) >= 10:
+        # best faces first, poor ones are not offered for enrollment at all
+        offered = {}
+        faces = sorted(
+            zip(
+                self.face_scores,
+                self.face_locations,
+                self.face_names,
+                self.face_encodings,
+            ),
+            key=lambda face: face[0],
+            reverse=True,
+        )
+        for score, (top, right, bottom, left), name, encoding in faces:
+            if score < self.engine.enrollQuality:
                 continue
+            if self.gallery.count(name) + offered.get(name, 0) >= 10:
+                continue
+            offered[name] = offered.get(name, 0) + 1
             top, right = int(top * scale), int(right * scale)
             bottom, left = int(bottom * scale), int(left * scale)
 
@@ -353,36 +583,43 @@ class AppMainWindow(QMainWindow, Ui_MainWindow):
 
         for face in self.uknown_faces:
             face.close()
-        self.addWindow.imageLabel.clear()
+        self.addView.clear()
 
         if fileName:
+            data = np.fromfile(fileName, dtype=np.uint8)
             self.frame = self._resize(
-                cv.imread(fileName),
+                cv.imdecode(data, cv.IMREAD_COLOR),
                 (self.addWindow.imageLabel.width(), self.addWindow.imageLabel.height()),
             )
+            # the same photo shown at the same size is only detected once
+            key = contentKey(data, "open", self.frame.shape)
             (
                 self.face_locations,
                 self.face_encodings,
                 self.face_names,
-            ) = self._detectAndVisualizeFaces(self.frame, 1)
+                self.face_scores,
+            ) = self._detectFaces(self.frame, 1, key)
 
             self.addWindow.browseProceedBtn.setEnabled(True)
-            self.addWindow.imageLabel.setPixmap(cvMatToQPixmap(self.frame))
+            self.addView.setFrame(self.frame, self.face_locations, self.face_names)
 
     def browseProceedBtn_clicked(self) -> None:
         self._proceed()
 
-    def okBtn_clicked(self) -> None:
-        sql = "INSERT INTO known_faces (name, encoding) VALUES (%s, %s)"
-        val = [
-            (face.text(), face.encoding.tobytes())
-            for face in self.uknown_faces
-            if (face.text() != "Unknown")
-        ]
+    def _write(self, fn, *args) -> None:
+        self.writer.submit(fn, *args).add_done_callback(self._writeDone)
 
-        self.cr.executemany(sql, val)
-        self.db.commit()
-        self.loadData()
+    def _writeDone(self, future: Future) -> None:
+        if future.exception() is not None:
+            traceback.print_exception(future.exception())
+
+    def okBtn_clicked(self) -> None:
+        faces = [face for face in self.uknown_faces if (face.text() != "Unknown")]
+        self._write(
+            self.engine.enroll,
+            [face.text() for face in faces],
+            [face.encoding for face in faces],
+        )
 
         self.addWindow.okBtn.setEnabled(False)
         self.addWindow.proceedBtn.setEnabled(False)
@@ -390,34 +627,35 @@ class AppMainWindow(QMainWindow, Ui_MainWindow):
 
         for face in self.uknown_faces:
             face.close()
-        self.addWindow.imageLabel.clear()
+        self.addView.clear()
 
     def delWindow_okBtn_clicked(self) -> None:
-        val, rows = [], []
-
-        for row in range(self.delWindow.deleteTable.rowCount()):
-            item0 = self.delWindow.deleteTable.item(row, 0)
-            item2 = self.delWindow.deleteTable.item(row, 2)
-            if item2.checkState() == Qt.CheckState.Checked:
-                val.append((int(item0.text()),))
-                rows.insert(0, row)
-
-        sql = "DELETE FROM known_faces WHERE id = %s"
-        self.cr.executemany(sql, val)
-        self.db.commit()
-
-        self.loadData()
-        for row in rows:
-            self.delWindow.deleteTable.removeRow(row)
+        # one set-based delete in the store, the gallery compacts in place
+        ids = self.faceModel.checkedIds()
+        if not ids:
+            return
+        self._write(self.engine.delete, ids)
+        self.faceModel.removeIds(ids)
+        self._updateDeleteTitle()
 
-    def videoLabel_doubleClicked(self, ev: QMouseEvent) -> None:
+    def videoLabel_doubleClicked(self, ev: QMouseEvent, camera: int = 0) -> None:
         if self.maxVideo.isHidden():
+            self.maxCamera = camera
             self.maxVideo.showMaximized()
-            self.videoLabel.clear()
+            (self.tiles[camera] if self.tiles else self.videoView).clear()
         else:
             self.maxVideo.hide()
 
     def closeEvent(self, event):
         event.accept()
-        self.cam.release()
-        self.db.close()
+        for thread in self.workers + self.grabbers:
+            thread.requestInterruption()
+        for thread in self.workers + self.grabbers:
+            thread.wait()
+        self.executor.shutdown(cancel_futures=True)
+        self.writer.shutdown()
+        if self.events is not None:
+            self.events.close()
+        self.engine.close()
+        if self.metricsServer is not None:
+            self.metricsServer.shutdown()
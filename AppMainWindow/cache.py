@@ -0,0 +1,125 @@
+from threading import Lock
+from time import time
+import hashlib
+import sqlite3
+import os
+import numpy as np
+
+# part of every key, bump it when detection, encoding or scoring changes
+VERSION = 1
+
+
+def contentKey(data, *params) -> str:
+    # the image bytes plus whatever changes the result, e.g. its size limit
+    digest = hashlib.sha256(data)
+    digest.update(repr((VERSION,) + params).encode())
+    return digest.hexdigest()
+
+
+def fileKey(fileName: str, *params) -> str:
+    digest = hashlib.sha256()
+    with open(fileName, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    digest.update(repr((VERSION,) + params).encode())
+    return digest.hexdigest()
+
+
+class DetectionCache:
+    # face locations, encodings and quality scores by content key, in one
+    # SQLite file. Arrays are stored as raw bytes, the least recently used
+    # entries are evicted once the file holds more than maxBytes of them.
+    # Hits only note their time in memory, the notes are written in one
+    # transaction every flushEvery hits, on put and on close
+
+    def __init__(
+        self, path: str, maxBytes: int = 256 << 20, flushEvery: int = 100
+    ) -> None:
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.lock = Lock()
+        self.maxBytes = maxBytes
+        self.flushEvery = flushEvery
+        self._used = {}
+        with self.lock, self.db:
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS detections (key TEXT PRIMARY KEY, locations BLOB, encodings BLOB, scores BLOB, size INTEGER, used REAL)"
+            )
+            self.db.execute(
+                "CREATE INDEX IF NOT EXISTS detections_used ON detections (used)"
+            )
+            self.size = self.db.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM detections"
+            ).fetchone()[0]
+
+    def get(self, key: str) -> tuple[list, list, list] | None:
+        with self.lock:
+            row = self.db.execute(
+                "SELECT locations, encodings, scores FROM detections WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                return None
+            self._used[key] = time()
+            if len(self._used) >= self.flushEvery:
+                with self.db:
+                    self._flushUsed()
+        locations, encodings, scores = row
+        face_locations = np.frombuffer(locations, dtype=np.int32).reshape(-1, 4)
+        face_encodings = np.frombuffer(encodings, dtype=np.float64).reshape(-1, 128)
+        return (
+            [tuple(int(v) for v in box) for box in face_locations],
+            [encoding.copy() for encoding in face_encodings],
+            np.frombuffer(scores, dtype=np.float64).tolist(),
+        )
+
+    def put(
+        self, key: str, face_locations: list, face_encodings: list, scores: list
+    ) -> None:
+        locations = np.asarray(face_locations, dtype=np.int32).tobytes()
+        encodings = np.asarray(face_encodings, dtype=np.float64).tobytes()
+        scores = np.asarray(scores, dtype=np.float64).tobytes()
+        size = len(key) + len(locations) + len(encodings) + len(scores)
+        with self.lock, self.db:
+            # before the insert, so eviction sees every hit and a pending
+            # note can not overwrite the time of this put
+            self._flushUsed()
+            old = self.db.execute(
+                "SELECT size FROM detections WHERE key = ?", (key,)
+            ).fetchone()
+            self.db.execute(
+                "INSERT OR REPLACE INTO detections VALUES (?, ?, ?, ?, ?, ?)",
+                (key, locations, encodings, scores, size, time()),
+            )
+            self.size += size - (old[0] if old else 0)
+            if self.size > self.maxBytes:
+                self._evict()
+
+    def _flushUsed(self) -> None:
+        # keys evicted since their hit match no row and are skipped
+        self.db.executemany(
+            "UPDATE detections SET used = ? WHERE key = ?",
+            [(used, key) for key, used in self._used.items()],
+        )
+        self._used.clear()
+
+    def _evict(self) -> None:
+        # down to 90% so that every put does not evict again
+        excess = self.size - int(self.maxBytes * 0.9)
+        keys = []
+        for key, size in self.db.execute(
+            "SELECT key, size FROM detections ORDER BY used"
+        ):
+            if excess <= 0:
+                break
+            keys.append((key,))
+            excess -= size
+            self.size -= size
+        self.db.executemany("DELETE FROM detections WHERE key = ?", keys)
+
+    def close(self) -> None:
+        with self.lock:
+            with self.db:
+                self._flushUsed()
+            self.db.close()
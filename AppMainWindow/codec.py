@@ -0,0 +1,28 @@
+import numpy as np
+
+# value of known_faces.version, 0 is the original raw float64 blob
+FORMATS = {"float64": 0, "float32": 1, "int8": 2}
+
+
+def encodeEncoding(encoding: np.ndarray, version: int) -> bytes:
+    if version == FORMATS["float64"]:
+        return np.asarray(encoding, dtype=np.float64).tobytes()
+    if version == FORMATS["float32"]:
+        return np.asarray(encoding, dtype=np.float32).tobytes()
+    if version == FORMATS["int8"]:
+        # symmetric per-vector scale, stored as a float32 header
+        scale = max(float(np.abs(encoding).max()) / 127, 1e-12)
+        quantized = np.clip(np.round(np.asarray(encoding) / scale), -127, 127)
+        return np.float32(scale).tobytes() + quantized.astype(np.int8).tobytes()
+    raise ValueError(f"unknown encoding version {version}")
+
+
+def decodeEncoding(blob: bytes, version: int) -> np.ndarray:
+    if version == FORMATS["float64"]:
+        return np.frombuffer(blob, dtype=np.float64)
+    if version == FORMATS["float32"]:
+        return np.frombuffer(blob, dtype=np.float32)
+    if version == FORMATS["int8"]:
+        scale = np.frombuffer(blob, dtype=np.float32, count=1)[0]
+        return np.frombuffer(blob, dtype=np.int8, offset=4) * scale
+    raise ValueError(f"unknown encoding version {version}")
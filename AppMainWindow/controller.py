@@ -0,0 +1,81 @@
+from math import sqrt
+
+
+class ScaleController:
+    # keeps the detection latency near `budget` seconds by scaling the
+    # detection frame, HOG cost grows with the pixel count so a factor of
+    # sqrt(budget / latency) is the step that should land on the budget
+
+    def __init__(
+        self,
+        budget: float = 0.1,
+        minFactor: float = 0.4,
+        maxFactor: float = 1.0,
+        upsample: tuple[int, int] = (0, 1),
+        jitters: tuple[int, int] = (1, 1),
+        smoothing: float = 0.3,
+        cooldown: int = 5,
+    ) -> None:
+        self.budget = budget
+        self.minFactor = minFactor
+        self.maxFactor = maxFactor
+        self.upsampleRange = upsample
+        self.jittersRange = jitters
+        self.smoothing = smoothing
+        self.cooldown = cooldown
+
+        self.factor = maxFactor
+        self.upsample = upsample[1]
+        self.jitters = jitters[0]
+        self.latency = None
+        self._sinceChange = 0
+
+    def observe(self, seconds: float) -> bool:
+        # returns True when the operating point changed
+        if self.latency is None:
+            self.latency = seconds
+        else:
+            self.latency += self.smoothing * (seconds - self.latency)
+
+        self._sinceChange += 1
+        if self._sinceChange < self.cooldown:
+            return False
+
+        if self.latency > 1.1 * self.budget:
+            changed = self._slower()
+        elif self.latency < 0.7 * self.budget:
+            changed = self._faster()
+        else:
+            changed = False
+
+        if changed:
+            self._sinceChange = 0
+        return changed
+
+    def _slower(self) -> bool:
+        # over budget: cheaper encodings first, then a smaller frame, then no upsampling
+        if self.jitters > self.jittersRange[0]:
+            self.jitters = self.jittersRange[0]
+            return True
+        if self.factor > self.minFactor:
+            step = sqrt(self.budget / self.latency)
+            self.factor = max(self.factor * step, self.minFactor)
+            return True
+        if self.upsample > self.upsampleRange[0]:
+            self.upsample -= 1
+            return True
+        return False
+
+    def _faster(self) -> bool:
+        # under budget: undo the cuts in reverse order, in small steps
+        if self.upsample < self.upsampleRange[1]:
+            self.upsample += 1
+            return True
+        if self.factor < self.maxFactor:
+            step = min(sqrt(self.budget / self.latency), 1.15)
+            self.factor = min(self.factor * step, self.maxFactor)
+            return True
+        if self.jitters < self.jittersRange[1]:
+            self.jitters += 1
+            return True
+        return False
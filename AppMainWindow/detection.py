@@ -0,0 +1,161 @@
+from multiprocessing import shared_memory
+from time import perf_counter
+import numpy as np
+import cv2 as cv
+
+from .quality import scoreFaces
+
+# face_recognition loads every dlib model on import, so it is imported where
+# it is used and only the detection processes pay for that
+
+# shared frame buffers this process has attached to, by name
+_attached = {}
+
+
+def attachFrame(frame) -> np.ndarray:
+    # frames reach the detection processes as arrays or, to skip pickling, as
+    # (shared memory name, shape) of an RGB buffer the sender keeps alive
+    if isinstance(frame, np.ndarray):
+        return frame
+    name, shape = frame
+    shm = _attached.get(name)
+    if shm is None:
+        # the sender replaces its buffer when frames grow, old ones go
+        while len(_attached) >= 4:
+            try:
+                _attached.pop(next(iter(_attached))).close()
+            except BufferError:
+                pass
+        shm = _attached[name] = shared_memory.SharedMemory(name)
+    return np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+
+
+def fitScale(img: cv.Mat, screenSize: tuple[int, int]) -> float:
+    hi, wi = img.shape[:2]
+    ws, hs = screenSize
+    return min(ws / wi, hs / hi)
+
+
+def fitSize(img: cv.Mat, screenSize: tuple[int, int]) -> tuple[int, int]:
+    hi, wi = img.shape[:2]
+    ws, hs = screenSize
+    ri, rs = wi / hi, ws / hs
+
+    wn = int(wi * hs / hi) if (rs > ri) else ws
+    hn = hs if (rs > ri) else int(hi * ws / wi)
+    return (max(wn, 1), max(hn, 1))
+
+
+def resizeFrame(
+    img: cv.Mat, screenSize: tuple[int, int], dst: np.ndarray | None = None
+) -> cv.Mat:
+    # dst, when it has the right shape, is written in place instead of allocating
+    hi, wi = img.shape[:2]
+    wn, hn = fitSize(img, screenSize)
+
+    if (wn * hn) < (wi * hi):
+        return cv.resize(img, (wn, hn), dst=dst, interpolation=cv.INTER_AREA)
+    else:
+        return cv.resize(img, (wn, hn), dst=dst, interpolation=cv.INTER_LINEAR)
+
+
+def prepareFrame(img: cv.Mat, scale: float = 0.7) -> np.ndarray:
+    small_frame = cv.resize(
+        img, (0, 0), fx=scale, fy=scale, interpolation=cv.INTER_AREA
+    )
+    return cv.cvtColor(small_frame, cv.COLOR_BGR2RGB)
+
+
+def locateFaces(rgbFrame: np.ndarray) -> list:
+    import face_recognition as fr
+
+    return fr.face_locations(rgbFrame)
+
+
+def locateEncodeAndScore(rgbFrame: np.ndarray) -> tuple[list, list, list]:
+    import face_recognition as fr
+
+    face_locations = fr.face_locations(rgbFrame)
+    face_encodings = fr.face_encodings(rgbFrame, face_locations)
+    return (face_locations, face_encodings, scoreFaces(rgbFrame, face_locations))
+
+
+def locateInRegions(rgbFrame: np.ndarray, regions: list, upsample: int = 1) -> list:
+    import face_recognition as fr
+
+    face_locations = []
+    for top, right, bottom, left in regions:
+        crop = rgbFrame[top:bottom, left:right]
+        for t, r, b, l in fr.face_locations(crop, upsample):
+            face_locations.append((t + top, r + left, b + top, l + left))
+    return face_locations
+
+
+def timedLocateAndEncode(
+    rgbFrame: np.ndarray,
+    regions: list | None = None,
+    upsample: int = 1,
+    jitters: int = 1,
+    minQuality: float = 0.0,
+    maxFaces: int | None = None,
+) -> tuple[list, list | None, float, float]:
+    # with more than maxFaces faces they are only located, encodings is None
+    # and the caller spreads them over the pool, see RecognitionWorker._encode
+    import face_recognition as fr
+
+    rgbFrame = attachFrame(rgbFrame)
+    start = perf_counter()
+    if regions is None:
+        face_locations = fr.face_locations(rgbFrame, upsample)
+    else:
+        face_locations = locateInRegions(rgbFrame, regions, upsample)
+    located = perf_counter()
+    if (maxFaces is not None) and (len(face_locations) > maxFaces):
+        return (face_locations, None, located - start, 0.0)
+    face_encodings = encodeFaces(rgbFrame, face_locations, jitters, minQuality)
+    encoded = perf_counter()
+    return (face_locations, face_encodings, located - start, encoded - located)
+
+
+def encodeFaces(
+    rgbFrame: np.ndarray,
+    face_locations: list,
+    jitters: int = 1,
+    minQuality: float = 0.0,
+) -> list:
+    # faces under minQuality are not encoded, their slot is None
+    import face_recognition as fr
+
+    rgbFrame = attachFrame(rgbFrame)
+    if minQuality <= 0:
+        return fr.face_encodings(rgbFrame, face_locations, jitters)
+    scores = scoreFaces(rgbFrame, face_locations)
+    good = [i for i, score in enumerate(scores) if score >= minQuality]
+    face_encodings = [None] * len(face_locations)
+    encodings = fr.face_encodings(rgbFrame, [face_locations[i] for i in good], jitters)
+    for i, encoding in zip(good, encodings):
+        face_encodings[i] = encoding
+    return face_encodings
+
+
+def locateAndEncodeFile(fileName: str, maxSize: int = 0) -> tuple[list, list, list]:
+    img = cv.imread(fileName)
+    if img is None:
+        return ([], [], [])
+    scale = min(fitScale(img, (maxSize, maxSize)), 1) if maxSize else 1
+    return locateEncodeAndScore(prepareFrame(img, scale))
+
+
+def warmUp() -> float:
+    # runs in every detection process as it starts: loads the dlib models and
+    # runs each stage once on a blank frame, so the first real frame pays for
+    # neither. Returns how long that took
+    import face_recognition as fr
+
+    start = perf_counter()
+    rgbFrame = np.zeros((120, 160, 3), dtype=np.uint8)
+    box = [(10, 110, 110, 10)]
+    fr.face_locations(rgbFrame)
+    fr.face_encodings(rgbFrame, box)
+    scoreFaces(rgbFrame, box)
+    return perf_counter() - start
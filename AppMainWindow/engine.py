@@ -0,0 +1,271 @@
+from concurrent.futures import Executor, Future
+from typing import Callable
+from threading import Thread
+from queue import Queue, Empty
+from time import perf_counter
+import numpy as np
+
+from .detection import prepareFrame, locateEncodeAndScore
+from .gallery import FaceGallery
+from .annindex import IVFIndex
+from .prototypes import PrototypeIndex
+from .shards import ShardedGallery
+from .codec import FORMATS, encodeEncoding, decodeEncoding
+from .snapshot import loadSnapshot, saveSnapshot
+from .store import FaceStore
+from .cache import DetectionCache
+from .metrics import Metrics
+
+
+class MatchBatcher:
+    # encodings from concurrent callers are matched together in one gallery
+    # pass, the first caller waits at most maxDelay for others to join
+    def __init__(
+        self,
+        match: Callable[[list], list],
+        maxBatch: int = 256,
+        maxDelay: float = 0.002,
+        metrics: Metrics | None = None,
+    ) -> None:
+        self.matchFn = match
+        self.maxBatch = maxBatch
+        self.maxDelay = maxDelay
+        self.metrics = metrics or Metrics()
+        self.queue = Queue()
+        Thread(target=self._run, daemon=True).start()
+
+    def match(self, face_encodings: list) -> list:
+        if len(face_encodings) == 0:
+            return []
+        future = Future()
+        self.queue.put((face_encodings, future))
+        return future.result()
+
+    def close(self) -> None:
+        self.queue.put(None)
+
+    def _collect(self, first: tuple) -> list:
+        batch, size = [first], len(first[0])
+        deadline = perf_counter() + self.maxDelay
+        while size < self.maxBatch:
+            timeout = deadline - perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                item = self.queue.get(timeout=timeout)
+            except Empty:
+                break
+            if item is None:
+                self.queue.put(None)
+                break
+            batch.append(item)
+            size += len(item[0])
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            batch = self._collect(item)
+            face_encodings = [e for encodings, _ in batch for e in encodings]
+
+            try:
+                with self.metrics.time("match"):
+                    face_names = self.matchFn(face_encodings)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.metrics.increment("match_batches")
+            self.metrics.increment("match_requests", len(batch))
+
+            start = 0
+            for encodings, future in batch:
+                future.set_result(face_names[start : start + len(encodings)])
+                start += len(encodings)
+
+
+class FaceEngine:
+    # everything recognition needs without Qt: the store, the in-memory
+    # gallery with its snapshot, detection on an executor and batched matching
+
+    def __init__(
+        self,
+        store: FaceStore,
+        encodingFormat: str = "float32",
+        snapshotDir: str | None = None,
+        executor: Executor | None = None,
+        metrics: Metrics | None = None,
+        enrollQuality: float = 0.5,
+        minDistance: float = 0.15,
+        prototypes: str | None = None,
+        cache: DetectionCache | None = None,
+        shards: int = 0,
+        nprobe: int = 8,
+    ) -> None:
+        self.store = store
+        self.cache = cache
+        self.executor = executor
+        self.metrics = metrics or Metrics()
+        self.enrollQuality = enrollQuality
+        self.minDistance = minDistance
+        self.snapshotDir = snapshotDir
+        self.snapshotDirty = False
+        self.encodingVersion = FORMATS[encodingFormat]
+        dtype = np.float64 if (encodingFormat == "float64") else np.float32
+
+        # prototypes ("mean", "medoid" or "kmeans") replace the IVF index,
+        # which scans the nprobe buckets nearest to a face.
+        # With shards the gallery is split over that many processes
+        if shards:
+            self.gallery = ShardedGallery(
+                shards, dtype=dtype, prototypes=prototypes, nprobe=nprobe
+            )
+        else:
+            index = (
+                PrototypeIndex(prototypes) if prototypes else IVFIndex(nprobe=nprobe)
+            )
+            self.gallery = FaceGallery(index=index, dtype=dtype)
+        self.batcher = MatchBatcher(self.gallery.match, metrics=self.metrics)
+
+    def prepare(self, migrate: bool = False) -> None:
+        # rows keep the format they were stored in unless asked to migrate,
+        # going to int8 loses precision for good
+        self.store.prepare()
+        if migrate:
+            self.store.migrate(self.encodingVersion)
+        self.load()
+
+    def load(self) -> None:
+        maxId = None
+        if self.snapshotDir is not None:
+            maxId = self._loadSnapshot()
+
+        if maxId is None:
+            self.gallery.load(
+                (id, name, decodeEncoding(encoding, version))
+                for rows in self.store.iterRows()
+                for id, name, encoding, version in rows
+            )
+            self.snapshotDirty = True
+        else:
+            self._syncSnapshot(maxId)
+        self.metrics.set("gallery_size", len(self.gallery))
+        self.saveSnapshot()
+        # the index is still being trained, the next snapshot should have it
+        if self.gallery.training:
+            self.snapshotDirty = True
+
+    def _loadSnapshot(self) -> int | None:
+        # attaches the snapshot, returns its highest id or None without one.
+        # A snapshot of another database, or of rows deleted or migrated since,
+        # has another fingerprint and is loaded from the store instead
+        fingerprint = self.store.fingerprint
+        if isinstance(self.gallery, ShardedGallery):
+            return self.gallery.loadSnapshot(
+                self.snapshotDir, self.encodingVersion, fingerprint
+            )
+        snapshot = loadSnapshot(self.snapshotDir, self.encodingVersion, fingerprint)
+        if snapshot is None:
+            return None
+        maxId, ids, names, encodings, sqnorms, indexState = snapshot
+        self.gallery.attach(ids, names, encodings, sqnorms, indexState)
+        return maxId
+
+    def _syncSnapshot(self, maxId: int) -> None:
+        # rows added since the snapshot was taken, anything else changes the
+        # fingerprint
+        for rows in self.store.iterRows(maxId):
+            self.gallery.append(
+                [id for id, _, _, _ in rows],
+                [name for _, name, _, _ in rows],
+                [decodeEncoding(encoding, version) for _, _, encoding, version in rows],
+            )
+            self.snapshotDirty = True
+
+    def saveSnapshot(self) -> None:
+        if (self.snapshotDir is None) or (not self.snapshotDirty):
+            return
+        ids = self.gallery.ids
+        source = self.store.fingerprint(int(ids.max()) if len(ids) else 0)
+        if isinstance(self.gallery, ShardedGallery):
+            self.gallery.saveSnapshot(self.snapshotDir, self.encodingVersion, source)
+        else:
+            saveSnapshot(self.snapshotDir, self.gallery, self.encodingVersion, source)
+        self.snapshotDirty = False
+
+    def _call(self, fn: Callable, *args):
+        if self.executor is None:
+            return fn(*args)
+        return self.executor.submit(fn, *args).result()
+
+    def detect(
+        self, img: np.ndarray, scale: float = 1.0, key: str | None = None
+    ) -> tuple[list, list, list]:
+        # locations, encodings and quality scores, see quality.faceQuality.
+        # With a cache.contentKey of the image a repeated image skips detection
+        if (key is not None) and (self.cache is not None):
+            results = self.cache.get(key)
+            if results is not None:
+                self.metrics.increment("cache_hits")
+                return results
+        with self.metrics.time("detect"):
+            results = self._call(locateEncodeAndScore, prepareFrame(img, scale))
+        if (key is not None) and (self.cache is not None):
+            self.cache.put(key, *results)
+        return results
+
+    def recognize(
+        self, img: np.ndarray, scale: float = 1.0, key: str | None = None
+    ) -> tuple[list, list, list, list]:
+        face_locations, face_encodings, scores = self.detect(img, scale, key)
+        face_names = self.batcher.match(face_encodings)
+        return (face_locations, face_encodings, face_names, scores)
+
+    def _isDuplicate(self, name: str, encoding: np.ndarray, batch: list) -> bool:
+        # another sample this close to one already stored for the name adds nothing
+        known = [e for n, e in batch if n == name]
+        known = np.vstack([self.gallery.encodingsOf(name)] + known)
+        distances = np.linalg.norm(known - encoding, axis=1)
+        return bool(len(distances)) and bool(distances.min() < self.minDistance)
+
+    def enroll(self, names: list, face_encodings: list) -> list:
+        # returns the ids of the rows actually stored, near-duplicates are skipped
+        batch = []
+        for name, encoding in zip(names, face_encodings):
+            encoding = np.asarray(encoding, dtype=np.float64).reshape(-1)
+            if not self._isDuplicate(name, encoding, batch):
+                batch.append((name, encoding))
+        if not batch:
+            return []
+
+        # the gallery gets the encodings as stored, so both match the same way
+        version = self.encodingVersion
+        names = [name for name, _ in batch]
+        rows = [
+            (name, encodeEncoding(encoding, version), version)
+            for name, encoding in batch
+        ]
+        ids = self.store.insert(rows)
+        self.gallery.append(
+            ids, names, [decodeEncoding(encoding, version) for _, encoding, _ in rows]
+        )
+        self.metrics.set("gallery_size", len(self.gallery))
+        self.snapshotDirty = True
+        return ids
+
+    def delete(self, ids: list) -> None:
+        self.store.delete(ids)
+        self.gallery.delete(ids)
+        self.metrics.set("gallery_size", len(self.gallery))
+        self.snapshotDirty = True
+
+    def close(self) -> None:
+        self.batcher.close()
+        self.saveSnapshot()
+        if isinstance(self.gallery, ShardedGallery):
+            self.gallery.close()
+        self.store.close()
+        if self.cache is not None:
+            self.cache.close()
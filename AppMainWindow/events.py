@@ -0,0 +1,143 @@
+from threading import Lock, Thread
+from queue import Queue, Empty, Full
+from time import monotonic, time
+import traceback
+
+from .store import FaceStore
+from .metrics import Metrics
+
+
+class EventLog:
+    # who was seen, when and by which camera, written behind the frame path:
+    # record() only appends to a bounded queue and drops (and counts) events
+    # when it is full, a writer thread drains it into recognition_events with
+    # multi-row inserts and deletes events older than retentionDays
+
+    def __init__(
+        self,
+        store: FaceStore,
+        metrics: Metrics | None = None,
+        maxQueue: int = 10000,
+        batchSize: int = 500,
+        maxDelay: float = 1.0,
+        repeatAfter: float = 60.0,
+        retentionDays: float | None = 30,
+        pruneEvery: float = 3600.0,
+    ) -> None:
+        self.store = store
+        self.metrics = metrics or Metrics()
+        self.batchSize = batchSize
+        self.maxDelay = maxDelay
+        self.repeatAfter = repeatAfter
+        self.retentionDays = retentionDays
+        self.pruneEvery = pruneEvery
+        self.queue = Queue(maxQueue)
+
+        # (source, track) -> (name, time of the last event)
+        self._last = {}
+        self._lock = Lock()
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def record(
+        self,
+        source: str,
+        keys: list,
+        face_locations: list,
+        face_names: list,
+        face_distances: list,
+        scale: float = 1.0,
+    ) -> None:
+        # keys tell faces apart between frames, e.g. track ids: a face is
+        # logged when it appears, when its name changes and every repeatAfter
+        now = time()
+        events = []
+        with self._lock:
+            for key, box, name, distance in zip(
+                keys, face_locations, face_names, face_distances
+            ):
+                last = self._last.get((source, key))
+                if (
+                    (last is not None)
+                    and (last[0] == name)
+                    and (now - last[1] < self.repeatAfter)
+                ):
+                    continue
+                self._last[(source, key)] = (name, now)
+                box = tuple(int(round(v / scale)) for v in box)
+                events.append((now, source, name, distance, *box))
+
+            if len(self._last) > 10000:
+                self._last = {
+                    key: value
+                    for key, value in self._last.items()
+                    if now - value[1] < self.repeatAfter
+                }
+
+        for event in events:
+            try:
+                self.queue.put_nowait(event)
+            except Full:
+                self.metrics.increment("events_dropped")
+            else:
+                self.metrics.increment("events_recorded")
+
+    def close(self, timeout: float = 5.0) -> None:
+        # whatever is queued is written, unless the database takes too long
+        try:
+            self.queue.put(None, timeout=timeout)
+        except Full:
+            return
+        self._thread.join(timeout)
+
+    def _collect(self, first: tuple) -> tuple[list, bool]:
+        batch = [first]
+        deadline = monotonic() + self.maxDelay
+        while len(batch) < self.batchSize:
+            timeout = deadline - monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = self.queue.get(timeout=timeout)
+            except Empty:
+                break
+            if item is None:
+                return (batch, True)
+            batch.append(item)
+        return (batch, False)
+
+    def _write(self, batch: list) -> None:
+        try:
+            with self.metrics.time("event_write"):
+                self.store.insertEvents(batch)
+        except Exception:
+            traceback.print_exc()
+            self.metrics.increment("events_failed", len(batch))
+            return
+        self.metrics.increment("events_written", len(batch))
+        self.metrics.increment("event_batches")
+
+    def _prune(self) -> None:
+        if self.retentionDays is None:
+            return
+        try:
+            deleted = self.store.pruneEvents(time() - self.retentionDays * 86400)
+        except Exception:
+            traceback.print_exc()
+            return
+        self.metrics.increment("events_pruned", deleted)
+
+    def _run(self) -> None:
+        nextPrune = monotonic()
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            batch, closing = self._collect(item)
+            self._write(batch)
+            self.metrics.set("event_queue", self.queue.qsize())
+            if closing:
+                return
+            if monotonic() >= nextPrune:
+                self._prune()
+                nextPrune = monotonic() + self.pruneEvery
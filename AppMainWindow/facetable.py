@@ -0,0 +1,135 @@
+from PyQt6.QtCore import QAbstractTableModel, QModelIndex, Qt
+
+from .store import FaceStore
+
+
+class FaceTableModel(QAbstractTableModel):
+    # known_faces a page at a time: the view asks for more rows through
+    # canFetchMore/fetchMore as it scrolls, filtering and counting run in SQL
+    headers = ["Id", "Name", "Samples", "Delete"]
+
+    def __init__(self, store: FaceStore, pageSize: int = 200, parent=None) -> None:
+        super().__init__(parent)
+        self.store = store
+        self.pageSize = pageSize
+        self.search = ""
+        self.rows = []
+        self.counts = {}
+        self.checked = set()
+        self.total = (0, 0)
+        self._exhausted = True
+
+    def setSearch(self, search: str) -> None:
+        self.beginResetModel()
+        self.search = search
+        self.rows = []
+        self.counts = {}
+        self.checked = set()
+        self.total = self.store.countFaces(search)
+        self._exhausted = False
+        self.endResetModel()
+
+    def clear(self) -> None:
+        self.beginResetModel()
+        self.rows, self.counts, self.checked = [], {}, set()
+        self._exhausted = True
+        self.endResetModel()
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.headers)
+
+    def canFetchMore(self, parent: QModelIndex = QModelIndex()) -> bool:
+        return (not parent.isValid()) and (not self._exhausted)
+
+    def fetchMore(self, parent: QModelIndex = QModelIndex()) -> None:
+        afterId = self.rows[-1][0] if self.rows else 0
+        page = self.store.pageFaces(afterId, self.pageSize, self.search)
+        self._exhausted = len(page) < self.pageSize
+        if not page:
+            return
+        names = {name for _, name in page if name not in self.counts}
+        self.counts.update(self.store.countsOf(sorted(names)))
+
+        self.beginInsertRows(
+            QModelIndex(), len(self.rows), len(self.rows) + len(page) - 1
+        )
+        self.rows.extend(page)
+        self.endInsertRows()
+
+    def headerData(self, section: int, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if (orientation == Qt.Orientation.Horizontal) and (
+            role == Qt.ItemDataRole.DisplayRole
+        ):
+            return self.headers[section]
+        return None
+
+    def data(self, index: QModelIndex, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        id, name = self.rows[index.row()]
+        column = index.column()
+        if role == Qt.ItemDataRole.DisplayRole:
+            if column == 0:
+                return str(id)
+            if column == 1:
+                return name
+            if column == 2:
+                return str(self.counts.get(name, 0))
+        if (role == Qt.ItemDataRole.CheckStateRole) and (column == 3):
+            if id in self.checked:
+                return Qt.CheckState.Checked
+            return Qt.CheckState.Unchecked
+        return None
+
+    def flags(self, index: QModelIndex) -> Qt.ItemFlag:
+        flags = Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsSelectable
+        if index.column() == 3:
+            flags |= Qt.ItemFlag.ItemIsUserCheckable
+        return flags
+
+    def setData(self, index: QModelIndex, value, role=Qt.ItemDataRole.EditRole) -> bool:
+        if (role != Qt.ItemDataRole.CheckStateRole) or (index.column() != 3):
+            return False
+        id = self.rows[index.row()][0]
+        if Qt.CheckState(value) == Qt.CheckState.Checked:
+            self.checked.add(id)
+        else:
+            self.checked.discard(id)
+        self.dataChanged.emit(index, index, [role])
+        return True
+
+    def checkedIds(self) -> list:
+        return sorted(self.checked)
+
+    def removeIds(self, ids: list) -> None:
+        # drops deleted rows in contiguous runs, the rest of the view stays put
+        ids = set(ids)
+        doomed = [row for row, (id, _) in enumerate(self.rows) if id in ids]
+        names = {self.rows[row][1] for row in doomed}
+        for row in doomed:
+            self.counts[self.rows[row][1]] -= 1
+
+        runs = []
+        for row in doomed:
+            if runs and (row == runs[-1][1] + 1):
+                runs[-1][1] = row
+            else:
+                runs.append([row, row])
+        for start, end in reversed(runs):
+            self._removeRun(start, end)
+
+        rows, people = self.total
+        gone = sum(1 for name in names if self.counts[name] <= 0)
+        self.total = (rows - len(doomed), people - gone)
+        self.checked -= ids
+        if doomed and self.rows:
+            # the sample counts of other rows of the same people changed
+            self.dataChanged.emit(self.index(0, 2), self.index(len(self.rows) - 1, 2))
+
+    def _removeRun(self, start: int, end: int) -> None:
+        self.beginRemoveRows(QModelIndex(), start, end)
+        del self.rows[start : end + 1]
+        self.endRemoveRows()
@@ -0,0 +1,318 @@
+from typing import Iterable
+from threading import RLock, Thread
+import traceback
+import copy
+import numpy as np
+
+from .annindex import IVFIndex
+from .prototypes import PrototypeIndex
+
+
+class FaceGallery:
+    def __init__(
+        self,
+        dim: int = 128,
+        capacity: int = 1024,
+        index: IVFIndex | PrototypeIndex | None = None,
+        fallback: str = "exact",
+        fallbackWiden: int = 4,
+        dtype: type = np.float64,
+        recheckMargin: float = 0.01,
+    ) -> None:
+        self.dim = dim
+        self.dtype = dtype
+        self.lock = RLock()
+        self.index = index
+        self.fallback = fallback
+        self.fallbackWiden = fallbackWiden
+        self.recheckMargin = recheckMargin
+
+        self._encodings = np.empty((capacity, dim), dtype=dtype)
+        self._sqnorms = np.empty(capacity, dtype=dtype)
+        self._ids = np.empty(capacity, dtype=np.int64)
+        self._names = np.empty(capacity, dtype=object)
+        self._size = 0
+        # bumped whenever rows move or the index is rebuilt, a background
+        # training started before that is stale
+        self._generation = 0
+        self._training = None
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def training(self) -> bool:
+        return self._training is not None
+
+    @property
+    def encodings(self) -> np.ndarray:
+        return self._encodings[: self._size]
+
+    @property
+    def ids(self) -> np.ndarray:
+        return self._ids[: self._size]
+
+    @property
+    def names(self) -> np.ndarray:
+        return self._names[: self._size]
+
+    @property
+    def sqnorms(self) -> np.ndarray:
+        return self._sqnorms[: self._size]
+
+    def _reserve(self, capacity: int) -> None:
+        # attached snapshot arrays are read-only, copy them on the first write
+        writeable = self._encodings.flags.writeable and self._ids.flags.writeable
+        if (capacity <= len(self._ids)) and writeable:
+            return
+        capacity = max(capacity, 2 * len(self._ids) if writeable else self._size)
+        n = self._size
+
+        encodings = np.empty((capacity, self.dim), dtype=self.dtype)
+        sqnorms = np.empty(capacity, dtype=self.dtype)
+        ids = np.empty(capacity, dtype=np.int64)
+        names = np.empty(capacity, dtype=object)
+        encodings[:n], sqnorms[:n] = self._encodings[:n], self._sqnorms[:n]
+        ids[:n], names[:n] = self._ids[:n], self._names[:n]
+
+        self._encodings, self._sqnorms = encodings, sqnorms
+        self._ids, self._names = ids, names
+
+    def clear(self) -> None:
+        with self.lock:
+            self._size = 0
+            self._generation += 1
+            if self.index is not None:
+                self.index.reset()
+
+    def rebuildIndex(self) -> None:
+        with self.lock:
+            self._generation += 1
+            if self.index is not None:
+                self.index.train(self.encodings, self.names)
+
+    def trainInBackground(self) -> None:
+        # k-means runs on a copy of the rows without the lock, matching stays
+        # exhaustive until the trained index is swapped in
+        with self.lock:
+            if (self.index is None) or (self._training is not None):
+                return
+            index = copy.copy(self.index)
+            args = (index, self._generation, self._size)
+            # read-only (attached) rows are copied before they are changed
+            encodings = self.encodings
+            if self._encodings.flags.writeable:
+                encodings = encodings.copy()
+            rows = (encodings, self.names.copy())
+            self._training = Thread(target=self._train, args=args + rows, daemon=True)
+            self._training.start()
+
+    def _train(
+        self,
+        index: IVFIndex | PrototypeIndex,
+        generation: int,
+        n: int,
+        encodings: np.ndarray,
+        names: np.ndarray,
+    ) -> None:
+        try:
+            index.train(encodings, names)
+        except Exception:
+            traceback.print_exc()
+            with self.lock:
+                self._training = None
+            return
+
+        with self.lock:
+            self._training = None
+            if generation != self._generation:
+                # rows were deleted or reloaded meanwhile, start over
+                if (not self.index.trained) and (self._size >= self.index.minSize):
+                    self.trainInBackground()
+                return
+            if index.trained and (self._size > n):
+                # rows appended meanwhile
+                index.add(self.encodings[n:], n, self.names[n:], self.encodings)
+            self.index = index
+
+    def attach(
+        self,
+        ids: np.ndarray,
+        names: np.ndarray,
+        encodings: np.ndarray,
+        sqnorms: np.ndarray | None = None,
+        indexState: tuple[str, dict] | None = None,
+    ) -> None:
+        # uses the arrays as they are, e.g. memory-mapped snapshot files.
+        # indexState is (stateKey, index.state()) saved with them, without a
+        # usable one the index is trained in the background
+        with self.lock:
+            self._encodings = np.asarray(encodings, dtype=self.dtype)
+            self._ids = np.asarray(ids, dtype=np.int64)
+            self._names = np.asarray(names, dtype=object)
+            if sqnorms is None:
+                sqnorms = np.einsum("ij,ij->i", self._encodings, self._encodings)
+            self._sqnorms = np.asarray(sqnorms, dtype=self.dtype)
+            self._size = len(self._ids)
+            self._generation += 1
+            if self.index is None:
+                return
+            self.index.reset()
+            if (indexState is not None) and (indexState[0] == self.index.stateKey):
+                self.index.restore(indexState[1], self._size)
+            if (not self.index.trained) and (self._size >= self.index.minSize):
+                self.trainInBackground()
+
+    def load(self, rows: Iterable[tuple[int, str, np.ndarray]]) -> None:
+        rows = list(rows)
+        with self.lock:
+            self._size = 0
+            self._reserve(len(rows))
+            for i, (id, name, encoding) in enumerate(rows):
+                self._ids[i] = id
+                self._names[i] = name
+                self._encodings[i] = encoding
+            self._size = len(rows)
+            self._sqnorms[: self._size] = np.einsum(
+                "ij,ij->i", self.encodings, self.encodings
+            )
+            self.rebuildIndex()
+
+    def append(self, ids: list, names: list, encodings: list) -> None:
+        if not ids:
+            return
+        encodings = np.asarray(encodings, dtype=self.dtype).reshape(-1, self.dim)
+        with self.lock:
+            start, stop = self._size, self._size + len(ids)
+            self._reserve(stop)
+            self._ids[start:stop] = ids
+            self._names[start:stop] = names
+            self._encodings[start:stop] = encodings
+            self._sqnorms[start:stop] = np.einsum("ij,ij->i", encodings, encodings)
+            self._size = stop
+
+            if (self.index is not None) and self.index.trained:
+                self.index.add(encodings, start, names, self.encodings)
+            elif (self.index is not None) and (stop >= self.index.minSize):
+                self.trainInBackground()
+
+    def delete(self, ids: list) -> None:
+        if not ids:
+            return
+        with self.lock:
+            keep = ~np.isin(self.ids, ids)
+            n = int(np.count_nonzero(keep))
+            if n == self._size:
+                return
+            self._reserve(self._size)
+            self._encodings[:n] = self.encodings[keep]
+            self._sqnorms[:n] = self._sqnorms[: self._size][keep]
+            self._ids[:n] = self.ids[keep]
+            self._names[:n] = self.names[keep]
+            self._names[n : self._size] = None
+            self._size = n
+            self._generation += 1
+
+            if self.index is not None:
+                self.index.remove(keep, self.encodings)
+
+    def count(self, name: str) -> int:
+        with self.lock:
+            return int(np.count_nonzero(self.names == name))
+
+    def encodingsOf(self, name: str) -> np.ndarray:
+        with self.lock:
+            return self.encodings[self.names == name].astype(np.float64)
+
+    def _sqdistances(self, queries: np.ndarray, rows=slice(None)) -> np.ndarray:
+        # |q - e|^2 = |q|^2 + |e|^2 - 2 q.e for every query/row pair at once
+        dist = queries @ self.encodings[rows].T
+        dist *= -2
+        dist += self._sqnorms[: self._size][rows]
+        dist += np.einsum("ij,ij->i", queries, queries)[:, None]
+        return np.maximum(dist, 0, out=dist)
+
+    @staticmethod
+    def _topk(dist: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        k = min(k, dist.shape[1])
+        if k < dist.shape[1]:
+            indices = np.argpartition(dist, k - 1, axis=1)[:, :k]
+        else:
+            indices = np.broadcast_to(np.arange(k), dist.shape)
+        dist = np.take_along_axis(dist, indices, axis=1)
+        order = np.argsort(dist, axis=1)
+        indices = np.take_along_axis(indices, order, axis=1)
+        return (np.sqrt(np.take_along_axis(dist, order, axis=1)), indices)
+
+    def search(
+        self, face_encodings: list, k: int = 1, exact: bool = False, widen: int = 1
+    ) -> tuple[np.ndarray, np.ndarray]:
+        queries = np.asarray(face_encodings, dtype=self.dtype).reshape(-1, self.dim)
+        with self.lock:
+            n = self._size
+            k = min(k, n)
+            if (n == 0) or (len(queries) == 0):
+                empty = np.empty((len(queries), 0))
+                return (empty, empty.astype(np.int64))
+
+            if exact or (self.index is None) or (not self.index.trained):
+                return self._topk(self._sqdistances(queries), k)
+
+            # approximate search, unprobed slots stay at inf distance
+            distances = np.full((len(queries), k), np.inf)
+            indices = np.zeros((len(queries), k), dtype=np.int64)
+            for i, rows in enumerate(self.index.probe(queries, widen)):
+                if len(rows) == 0:
+                    continue
+                dist, found = self._topk(self._sqdistances(queries[i : i + 1], rows), k)
+                distances[i, : dist.shape[1]] = dist[0]
+                indices[i, : dist.shape[1]] = rows[found[0]]
+            return (distances, indices)
+
+    def match(self, face_encodings: list, threshold: float = 0.4) -> list:
+        return self.matchWithDistances(face_encodings, threshold)[0]
+
+    def matchWithDistances(
+        self, face_encodings: list, threshold: float = 0.4
+    ) -> tuple[list, list]:
+        # names and the distance to the closest row, None for an empty gallery
+        with self.lock:
+            distances, indices = self.search(face_encodings, 1)
+            if distances.shape[1] == 0:
+                return (
+                    ["Unknown" for _ in range(len(face_encodings))],
+                    [None for _ in range(len(face_encodings))],
+                )
+
+            # the index may miss a match, so misses are re-checked: against
+            # every row with fallback "exact", so the decision at the threshold
+            # is the brute force one, or with "widen" against fallbackWiden
+            # times as many candidates, cheaper but a borderline face can stay
+            # unknown
+            missed = distances[:, 0] >= threshold
+            approximate = (self.index is not None) and self.index.trained
+            if approximate and missed.any():
+                queries = np.asarray(face_encodings)[missed]
+                if self.fallback == "widen":
+                    found = self.search(queries, 1, widen=self.fallbackWiden)
+                else:
+                    found = self.search(queries, 1, True)
+                distances[missed], indices[missed] = found
+
+            # compact dtypes round the distance, decide borderline faces in float64
+            best = distances[:, 0].astype(np.float64)
+            if self.dtype != np.float64:
+                near = np.abs(best - threshold) < self.recheckMargin
+                if near.any():
+                    queries = np.asarray(face_encodings, dtype=np.float64)[near]
+                    rows = self.encodings[indices[near, 0]].astype(np.float64)
+                    best[near] = np.linalg.norm(rows - queries, axis=1)
+
+            names = self.names[indices[:, 0]]
+            return (
+                [
+                    name if (distance < threshold) else "Unknown"
+                    for name, distance in zip(names, best)
+                ],
+                best.tolist(),
+            )
@@ -0,0 +1,135 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from contextlib import contextmanager
+from time import perf_counter
+from threading import Lock, Thread
+from bisect import bisect_left
+import os
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+class StageStats:
+    # cumulative prometheus-style buckets plus a ring of recent samples
+    def __init__(self, window: int) -> None:
+        self.recent = [0.0] * window
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.recent[self.count % len(self.recent)] = seconds
+        self.buckets[bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def percentiles(self) -> dict:
+        samples = sorted(self.recent[: min(self.count, len(self.recent))])
+        if not samples:
+            return {"p50": 0.0, "p95": 0.0, "p99": 0.0}
+        last = len(samples) - 1
+        return {
+            "p50": samples[int(last * 0.50)],
+            "p95": samples[int(last * 0.95)],
+            "p99": samples[int(last * 0.99)],
+        }
+
+
+class Metrics:
+    def __init__(self, window: int = 256) -> None:
+        self.window = window
+        self.lock = Lock()
+        self.stages = {}
+        self.counters = {}
+        self.gauges = {}
+
+    def observe(self, stage: str, seconds: float) -> None:
+        with self.lock:
+            if stage not in self.stages:
+                self.stages[stage] = StageStats(self.window)
+            self.stages[stage].observe(seconds)
+
+    @contextmanager
+    def time(self, stage: str):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, perf_counter() - start)
+
+    def increment(self, name: str, value: int = 1) -> None:
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def set(self, name: str, value: float) -> None:
+        with self.lock:
+            self.gauges[name] = value
+
+    def summary(self) -> dict:
+        with self.lock:
+            return {
+                "stages": {
+                    stage: stats.percentiles() for stage, stats in self.stages.items()
+                },
+                "counters": dict(self.counters),
+                "gauges": dict(self.gauges),
+            }
+
+    def overlayLines(self) -> list:
+        summary = self.summary()
+        lines = [
+            f"{stage}: {1000 * p['p50']:.1f} / {1000 * p['p95']:.1f} ms"
+            for stage, p in summary["stages"].items()
+        ]
+        lines += [f"{name}: {value}" for name, value in summary["counters"].items()]
+        lines += [f"{name}: {value:g}" for name, value in summary["gauges"].items()]
+        return lines
+
+    def prometheusText(self, prefix: str = "face_recognition") -> str:
+        lines = []
+        with self.lock:
+            name = f"{prefix}_stage_seconds"
+            lines.append(f"# TYPE {name} histogram")
+            for stage, stats in self.stages.items():
+                total = 0
+                for bound, count in zip(BUCKETS + ("+Inf",), stats.buckets):
+                    total += count
+                    lines.append(
+                        f'{name}_bucket{{stage="{stage}",le="{bound}"}} {total}'
+                    )
+                lines.append(f'{name}_sum{{stage="{stage}"}} {stats.sum}')
+                lines.append(f'{name}_count{{stage="{stage}"}} {stats.count}')
+
+            for counter, value in self.counters.items():
+                lines.append(f"# TYPE {prefix}_{counter}_total counter")
+                lines.append(f"{prefix}_{counter}_total {value}")
+            for gauge, value in self.gauges.items():
+                lines.append(f"# TYPE {prefix}_{gauge} gauge")
+                lines.append(f"{prefix}_{gauge} {value}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, path: str) -> None:
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(self.prometheusText())
+        os.replace(tmp, path)
+
+
+def serveMetrics(metrics: Metrics, port: int, host: str = "127.0.0.1"):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.prometheusText().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args) -> None:
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    return server
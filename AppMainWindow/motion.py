@@ -0,0 +1,123 @@
+import numpy as np
+import cv2 as cv
+
+
+def padBox(box: tuple, padding: float, shape: tuple) -> tuple:
+    top, right, bottom, left = box
+    dy, dx = int((bottom - top) * padding), int((right - left) * padding)
+    return (
+        max(top - dy, 0),
+        min(right + dx, shape[1]),
+        min(bottom + dy, shape[0]),
+        max(left - dx, 0),
+    )
+
+
+def mergeBoxes(boxes: list) -> list:
+    # union overlapping (top, right, bottom, left) boxes until none overlap
+    boxes = list(boxes)
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(boxes)):
+            for j in range(i + 1, len(boxes)):
+                a, b = boxes[i], boxes[j]
+                if (a[3] < b[1]) and (b[3] < a[1]) and (a[0] < b[2]) and (b[0] < a[2]):
+                    boxes[i] = (
+                        min(a[0], b[0]),
+                        max(a[1], b[1]),
+                        max(a[2], b[2]),
+                        min(a[3], b[3]),
+                    )
+                    del boxes[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return boxes
+
+
+class MotionGate:
+    # compares a tiny blurred grey copy of each frame with a running average
+    # background, detection then only runs on what changed plus known faces
+
+    def __init__(
+        self,
+        width: int = 160,
+        threshold: int = 25,
+        minArea: float = 0.002,
+        padding: float = 0.3,
+        fullFrame: float = 0.6,
+        maxIdleStride: int = 8,
+        learningRate: float = 0.05,
+    ) -> None:
+        self.width = width
+        self.threshold = threshold
+        self.minArea = minArea
+        self.padding = padding
+        self.fullFrame = fullFrame
+        self.maxIdleStride = maxIdleStride
+        self.learningRate = learningRate
+
+        self.reset()
+
+    def reset(self) -> None:
+        self._background = None
+        self._idleStride = 1
+        self._countdown = 0
+
+    def skip(self) -> bool:
+        # idle scenes are looked at every 2nd, 4th, ... maxIdleStride-th frame
+        if self._countdown > 0:
+            self._countdown -= 1
+            return True
+        return False
+
+    def _idle(self, idle: bool) -> None:
+        if idle:
+            self._idleStride = min(2 * self._idleStride, self.maxIdleStride)
+        else:
+            self._idleStride = 1
+        self._countdown = self._idleStride - 1
+
+    def regions(self, rgbFrame: np.ndarray, face_locations: list) -> list | None:
+        # None means the whole frame, an empty list means nothing to look at
+        height, width = rgbFrame.shape[:2]
+        ratio = self.width / width
+        small = cv.resize(rgbFrame, (self.width, max(int(height * ratio), 1)))
+        small = cv.GaussianBlur(cv.cvtColor(small, cv.COLOR_RGB2GRAY), (5, 5), 0)
+
+        if (self._background is None) or (self._background.shape != small.shape):
+            self._background = small.astype(np.float32)
+            self._idle(False)
+            return None
+
+        diff = cv.absdiff(small, cv.convertScaleAbs(self._background))
+        cv.accumulateWeighted(small, self._background, self.learningRate)
+        _, mask = cv.threshold(diff, self.threshold, 255, cv.THRESH_BINARY)
+        mask = cv.dilate(mask, None, iterations=2)
+        contours, _ = cv.findContours(mask, cv.RETR_EXTERNAL, cv.CHAIN_APPROX_SIMPLE)
+
+        boxes = []
+        minArea = self.minArea * small.shape[0] * small.shape[1]
+        for contour in contours:
+            if cv.contourArea(contour) < minArea:
+                continue
+            x, y, w, h = cv.boundingRect(contour)
+            box = (
+                int(y / ratio),
+                int((x + w) / ratio),
+                int((y + h) / ratio),
+                int(x / ratio),
+            )
+            boxes.append(padBox(box, self.padding, rgbFrame.shape))
+
+        # faces already in view are re-checked even when they hold still
+        boxes += [padBox(box, self.padding, rgbFrame.shape) for box in face_locations]
+        self._idle(not boxes)
+
+        boxes = mergeBoxes(boxes)
+        area = sum((b[2] - b[0]) * (b[1] - b[3]) for b in boxes)
+        if area > self.fullFrame * width * height:
+            return None
+        return boxes
@@ -0,0 +1,357 @@
+from concurrent.futures import Executor
+from multiprocessing import shared_memory
+from typing import Callable
+from threading import Condition
+from time import perf_counter
+
+from PyQt6.QtCore import QThread, pyqtSignal
+import numpy as np
+import cv2 as cv
+
+from .detection import prepareFrame, timedLocateAndEncode, encodeFaces
+from .tracking import FaceTracker
+from .motion import MotionGate
+from .controller import ScaleController
+from .events import EventLog
+from .metrics import Metrics
+
+
+class FrameGrabber(QThread):
+    frameReady = pyqtSignal()
+    opened = pyqtSignal(bool)
+
+    def __init__(
+        self,
+        filenameOrIndex: str | int = 0,
+        metrics: Metrics | None = None,
+        parent=None,
+    ) -> None:
+        super().__init__(parent)
+        # opening a camera or stream can take seconds, it is done in run()
+        self.source = filenameOrIndex
+        self.cam = None
+        self.metrics = metrics or Metrics()
+
+        self._cond = Condition()
+        self._frame = None
+        self._frameId = 0
+        self._pending = False
+
+    def run(self) -> None:
+        start = perf_counter()
+        self.cam = cv.VideoCapture(self.source)
+        self.metrics.observe("camera_open", perf_counter() - start)
+        self.opened.emit(self.cam.isOpened())
+
+        while not self.isInterruptionRequested():
+            start = perf_counter()
+            ret, frame = self.cam.read()
+            if not ret:
+                self.msleep(10)
+                continue
+            self.metrics.observe("capture", perf_counter() - start)
+            self.metrics.increment("frames_captured")
+
+            with self._cond:
+                self._frame = frame
+                self._frameId += 1
+                notify = not self._pending
+                if notify:
+                    self._pending = True
+                self._cond.notify_all()
+
+            # only one frameReady is ever queued, a slow GUI just skips frames
+            if notify:
+                self.frameReady.emit()
+            else:
+                self.metrics.increment("frames_dropped")
+
+        self.cam.release()
+
+    def latest(self) -> tuple[int, np.ndarray | None]:
+        with self._cond:
+            self._pending = False
+            return (self._frameId, self._frame)
+
+    def waitNewer(
+        self, frameId: int, timeout: float = 0.1
+    ) -> tuple[int, np.ndarray | None]:
+        with self._cond:
+            self._cond.wait_for(lambda: self._frameId > frameId, timeout)
+            return (self._frameId, self._frame)
+
+
+class SharedFrame:
+    # one reusable shared memory buffer, the detection processes read frames
+    # from it (detection.attachFrame) instead of getting them pickled
+
+    def __init__(self) -> None:
+        self.shm = None
+
+    def put(self, img: np.ndarray) -> tuple[str, tuple]:
+        if (self.shm is None) or (self.shm.size < img.nbytes):
+            self.close()
+            self.shm = shared_memory.SharedMemory(create=True, size=img.nbytes)
+        np.ndarray(img.shape, dtype=img.dtype, buffer=self.shm.buf)[:] = img
+        return (self.shm.name, img.shape)
+
+    def close(self) -> None:
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+
+class RecognitionWorker(QThread):
+    resultsReady = pyqtSignal(int, float, list, list, list)
+
+    def __init__(
+        self,
+        grabber: FrameGrabber,
+        match: Callable[[list], tuple[list, list]],
+        executor: Executor | None = None,
+        tracker: FaceTracker | None = None,
+        metrics: Metrics | None = None,
+        gate: MotionGate | None = None,
+        controller: ScaleController | None = None,
+        minQuality: float = 0.0,
+        events: EventLog | None = None,
+        encodeWorkers: int = 1,
+        parent=None,
+    ) -> None:
+        super().__init__(parent)
+        self.grabber = grabber
+        self.match = match
+        self.executor = executor
+        self.tracker = tracker
+        self.metrics = metrics or grabber.metrics
+        self.gate = gate
+        self.controller = controller
+        self.minQuality = minQuality
+        self.events = events
+        # frames with more faces than crowd are encoded on up to encodeWorkers
+        # processes at once, in chunks of at least two faces
+        self.encodeWorkers = encodeWorkers
+        self.crowd = 3
+        self.shared = SharedFrame() if (executor is not None) else None
+        self.scale = 0.7
+        self.enabled = True
+
+        self._lastLocations = []
+        self._lastScale = 1.0
+
+    def _call(self, fn: Callable, *args):
+        if self.executor is None:
+            return fn(*args)
+        return self.executor.submit(fn, *args).result()
+
+    def _share(self, rgbFrame: np.ndarray):
+        if self.shared is None:
+            return rgbFrame
+        return self.shared.put(rgbFrame)
+
+    def _encode(self, frame, face_locations: list) -> list:
+        # contiguous chunks on separate processes, joined back in order
+        jitters, minQuality = self._settings()[1:]
+        chunks = min(self.encodeWorkers, len(face_locations) // 2)
+        if (self.executor is None) or (chunks < 2):
+            return self._call(encodeFaces, frame, face_locations, jitters, minQuality)
+
+        bounds = np.linspace(0, len(face_locations), chunks + 1).astype(int)
+        futures = [
+            self.executor.submit(
+                encodeFaces, frame, face_locations[a:b], jitters, minQuality
+            )
+            for a, b in zip(bounds[:-1], bounds[1:])
+        ]
+        self.metrics.increment("parallel_encodes")
+        return [encoding for future in futures for encoding in future.result()]
+
+    def _match(self, face_encodings: list) -> tuple[list, list]:
+        # faces the quality gate skipped have no encoding to match yet
+        known = [encoding for encoding in face_encodings if encoding is not None]
+        if len(known) < len(face_encodings):
+            self.metrics.increment(
+                "low_quality_faces", len(face_encodings) - len(known)
+            )
+        with self.metrics.time("match"):
+            names, distances = self.match(known)
+        names, distances = iter(names), iter(distances)
+        face_names, face_distances = [], []
+        for encoding in face_encodings:
+            face_names.append("Unknown" if (encoding is None) else next(names))
+            face_distances.append(None if (encoding is None) else next(distances))
+        return (face_names, face_distances)
+
+    def _settings(self) -> tuple[int, int, float]:
+        if self.controller is None:
+            return (1, 1, self.minQuality)
+        return (self.controller.upsample, self.controller.jitters, self.minQuality)
+
+    def _adapt(self, seconds: float) -> None:
+        if (self.controller is None) or not self.controller.observe(seconds):
+            return
+        self.metrics.increment("operating_point_changes")
+        self._publishOperatingPoint()
+
+    def _publishOperatingPoint(self) -> None:
+        # the gauges the F3 overlay shows, set at start and on every change
+        self.metrics.set("detect_factor", round(self.controller.factor, 3))
+        self.metrics.set("upsample", self.controller.upsample)
+        self.metrics.set("jitters", self.controller.jitters)
+
+    def _regions(self, rgbFrame: np.ndarray, scale: float) -> list | None:
+        if self.gate is None:
+            return None
+        ratio = scale / self._lastScale
+        known = [tuple(int(v * ratio) for v in box) for box in self._lastLocations]
+        with self.metrics.time("motion"):
+            return self.gate.regions(rgbFrame, known)
+
+    def _detect(
+        self, rgbFrame: np.ndarray, scale: float
+    ) -> tuple[list, list, list, list]:
+        regions = self._regions(rgbFrame, scale)
+        if regions == []:
+            self.metrics.increment("idle_frames")
+            if self.tracker is not None:
+                gray = cv.cvtColor(rgbFrame, cv.COLOR_RGB2GRAY)
+                self.tracker.update(gray, scale, [], [], [])
+            return ([], [], [], [])
+        if regions is not None:
+            self.metrics.increment("region_detections")
+
+        start = perf_counter()
+        frame = self._share(rgbFrame)
+        maxFaces = self.crowd if (self.encodeWorkers > 1) else None
+        face_locations, face_encodings, locateTime, encodeTime = self._call(
+            timedLocateAndEncode, frame, regions, *self._settings(), maxFaces
+        )
+        if face_encodings is None:
+            # a crowd, the faces are spread over the pool
+            encodeStart = perf_counter()
+            face_encodings = self._encode(frame, face_locations)
+            encodeTime = perf_counter() - encodeStart
+        elapsed = perf_counter() - start
+        self.metrics.observe("locate", locateTime)
+        self.metrics.observe("encode", encodeTime)
+        # whatever is left is queueing and pickling to the worker process
+        self.metrics.observe("transfer", elapsed - locateTime - encodeTime)
+        self.metrics.increment("detections")
+        # region detections are cheaper, the budget has to hold for the whole frame
+        if regions is None:
+            self._adapt(elapsed)
+        face_names, face_distances = self._match(face_encodings)
+
+        if self.tracker is not None:
+            gray = cv.cvtColor(rgbFrame, cv.COLOR_RGB2GRAY)
+            self.tracker.update(
+                gray, scale, face_locations, face_encodings, face_names, face_distances
+            )
+            # tracks remember who a face was when this frame was too poor to tell
+            face_names = [track.name for track in self.tracker.tracks]
+            face_distances = [track.distance for track in self.tracker.tracks]
+        return (face_locations, face_encodings, face_names, face_distances)
+
+    def _track(
+        self, rgbFrame: np.ndarray, scale: float
+    ) -> tuple[list, list, list, list]:
+        with self.metrics.time("track"):
+            stale = self.tracker.propagate(cv.cvtColor(rgbFrame, cv.COLOR_RGB2GRAY))
+        self.metrics.increment("tracked_frames")
+
+        # only faces that drifted or lost flow points are encoded again
+        if stale:
+            locations = self.tracker.locations(scale, stale)
+            with self.metrics.time("reencode"):
+                encodings = self._encode(self._share(rgbFrame), locations)
+            # poor faces keep their old identity and are tried again next frame
+            names, distances = self._match(encodings)
+            for track, encoding, name, distance in zip(
+                stale, encodings, names, distances
+            ):
+                if encoding is not None:
+                    track.recognized(encoding, name, distance)
+            self.tracker.reseed(stale)
+
+        tracks = self.tracker.tracks
+        return (
+            self.tracker.locations(scale),
+            [track.encoding for track in tracks],
+            [track.name for track in tracks],
+            [track.distance for track in tracks],
+        )
+
+    def _record(
+        self,
+        face_locations: list,
+        face_encodings: list,
+        face_names: list,
+        face_distances: list,
+        scale: float,
+    ) -> None:
+        # faces not encoded yet have not been told apart, they are left out.
+        # Tracks keep one face between frames, without them the name does
+        if self.tracker is not None:
+            keys = [track.id for track in self.tracker.tracks]
+        else:
+            keys = list(face_names)
+        known = [i for i, encoding in enumerate(face_encodings) if encoding is not None]
+        if not known:
+            return
+        self.events.record(
+            str(self.grabber.source),
+            [keys[i] for i in known],
+            [face_locations[i] for i in known],
+            [face_names[i] for i in known],
+            [face_distances[i] for i in known],
+            scale,
+        )
+
+    def run(self) -> None:
+        frameId = 0
+        if self.controller is not None:
+            self._publishOperatingPoint()
+        while not self.isInterruptionRequested():
+            if not self.enabled:
+                if self.tracker is not None:
+                    self.tracker.reset()
+                if self.gate is not None:
+                    self.gate.reset()
+                self.msleep(20)
+                continue
+
+            # always jump to the newest frame, whatever arrived meanwhile is dropped
+            newId, frame = self.grabber.waitNewer(frameId)
+            if (newId == frameId) or (frame is None):
+                continue
+            frameId = newId
+            if (self.gate is not None) and self.gate.skip():
+                self.metrics.increment("idle_frames_skipped")
+                continue
+
+            scale = self.scale
+            if self.controller is not None:
+                scale *= self.controller.factor
+            with self.metrics.time("prepare"):
+                rgbFrame = prepareFrame(frame, scale)
+            if (self.tracker is None) or self.tracker.needsDetection(scale):
+                results = self._detect(rgbFrame, scale)
+            else:
+                results = self._track(rgbFrame, scale)
+
+            if not self.enabled:
+                continue
+            face_locations, face_encodings, face_names, face_distances = results
+            self._lastLocations, self._lastScale = face_locations, scale
+            self.metrics.set("faces_per_frame", len(face_locations))
+            if self.events is not None:
+                self._record(
+                    face_locations, face_encodings, face_names, face_distances, scale
+                )
+            self.resultsReady.emit(
+                frameId, scale, face_locations, face_encodings, face_names
+            )
+
+        if self.shared is not None:
+            self.shared.close()
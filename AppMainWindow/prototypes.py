@@ -0,0 +1,161 @@
+import numpy as np
+
+from .annindex import _sqdistances
+
+
+def prototypesOf(samples: np.ndarray, kind: str = "mean", k: int = 3) -> np.ndarray:
+    if (kind == "mean") or (len(samples) == 1):
+        return samples.mean(axis=0, keepdims=True)
+    if kind == "medoid":
+        return samples[[np.argmin(_sqdistances(samples, samples).sum(axis=1))]]
+
+    # a tiny k-means for people enrolled with and without glasses, beards, ...
+    k = min(k, len(samples))
+    centroids = samples[np.linspace(0, len(samples) - 1, k).astype(int)].copy()
+    for _ in range(5):
+        labels = np.argmin(_sqdistances(samples, centroids), axis=1)
+        for c in range(k):
+            if np.any(labels == c):
+                centroids[c] = samples[labels == c].mean(axis=0)
+    return centroids
+
+
+class PrototypeIndex:
+    # a few prototypes per identity, a query is compared with the prototypes
+    # first and only the `candidates` closest identities have all of their
+    # samples searched. Same interface as IVFIndex, so FaceGallery.match gives
+    # misses a second look at `widen` times as many identities
+
+    def __init__(
+        self,
+        kind: str = "mean",
+        k: int = 3,
+        candidates: int = 4,
+        minSize: int = 1000,
+    ) -> None:
+        self.kind = kind
+        self.k = k
+        self.candidates = candidates
+        self.minSize = minSize
+        self.reset()
+
+    @property
+    def trained(self) -> bool:
+        return self._trained
+
+    def reset(self) -> None:
+        # name -> [gallery rows, prototypes], the samples stay in the gallery
+        self.identities = {}
+        self._trained = False
+        self._matrix = None
+
+    @property
+    def stateKey(self) -> str:
+        return f"prototypes:{self.kind}:{self.k}"
+
+    def state(self) -> dict | None:
+        # identities with their rows and prototypes, in one array each
+        if not self.trained:
+            return None
+        entries = list(self.identities.values())
+        return {
+            "names": np.array(list(self.identities), dtype=str),
+            "rowCounts": np.array([len(rows) for rows, _ in entries]),
+            "rows": np.concatenate([rows for rows, _ in entries]),
+            "counts": np.array([len(prototypes) for _, prototypes in entries]),
+            "prototypes": np.vstack([prototypes for _, prototypes in entries]),
+        }
+
+    def restore(self, state: dict, size: int) -> bool:
+        rows = np.array(state["rows"])
+        if len(rows) != size:
+            return False
+        rowStarts = np.concatenate(([0], np.cumsum(state["rowCounts"])))
+        starts = np.concatenate(([0], np.cumsum(state["counts"])))
+        prototypes = np.array(state["prototypes"])
+        self.reset()
+        for i, name in enumerate(state["names"]):
+            self.identities[str(name)] = [
+                rows[rowStarts[i] : rowStarts[i + 1]],
+                prototypes[starts[i] : starts[i + 1]],
+            ]
+        self._trained = True
+        return True
+
+    def _set(self, name: str, rows: np.ndarray, allEncodings: np.ndarray) -> None:
+        samples = np.asarray(allEncodings[rows], dtype=np.float32)
+        self.identities[name] = [rows, prototypesOf(samples, self.kind, self.k)]
+        self._matrix = None
+
+    def train(self, encodings: np.ndarray, names: np.ndarray | None = None) -> None:
+        self.reset()
+        if (len(encodings) < self.minSize) or (names is None):
+            return
+        self._trained = True
+        self.add(encodings, 0, names, encodings)
+
+    def add(
+        self,
+        encodings: np.ndarray,
+        start: int,
+        names: np.ndarray | None = None,
+        allEncodings: np.ndarray | None = None,
+    ) -> None:
+        # allEncodings are the gallery's rows including the new ones, only
+        # the identities that got new samples are recomputed
+        if not self.trained:
+            return
+        unique, inverse = np.unique(
+            np.asarray(names, dtype=object), return_inverse=True
+        )
+        order = np.argsort(inverse, kind="stable")
+        bounds = np.searchsorted(inverse[order], np.arange(len(unique) + 1))
+        for i, name in enumerate(unique):
+            rows = start + order[bounds[i] : bounds[i + 1]]
+            if name in self.identities:
+                rows = np.concatenate((self.identities[name][0], rows))
+            self._set(name, rows, allEncodings)
+
+    def remove(self, keep: np.ndarray, allEncodings: np.ndarray | None = None) -> None:
+        # `keep` masks the gallery rows before compaction, surviving rows shift
+        # down. allEncodings are the gallery's rows after it
+        if not self.trained:
+            return
+        newRows = np.cumsum(keep) - 1
+        for name in list(self.identities):
+            rows = self.identities[name][0]
+            alive = keep[rows]
+            if alive.all():
+                self.identities[name][0] = newRows[rows]
+            elif alive.any():
+                self._set(name, newRows[rows[alive]], allEncodings)
+            else:
+                del self.identities[name]
+        self._matrix = None
+
+    def _build(self) -> None:
+        entries = list(self.identities.values())
+        self._rows = [rows for rows, _ in entries]
+        counts = [len(prototypes) for _, prototypes in entries]
+        self._starts = np.concatenate(([0], np.cumsum(counts)[:-1])).astype(np.int64)
+        self._matrix = (
+            np.vstack([prototypes for _, prototypes in entries])
+            if entries
+            else np.empty((0, 0), dtype=np.float32)
+        )
+
+    def probe(self, queries: np.ndarray, widen: int = 1) -> list:
+        if self._matrix is None:
+            self._build()
+        if not self._rows:
+            return [np.empty(0, dtype=np.int64) for _ in range(len(queries))]
+
+        dist = _sqdistances(np.asarray(queries, dtype=np.float32), self._matrix)
+        # closest prototype of every identity
+        dist = np.minimum.reduceat(dist, self._starts, axis=1)
+        candidates = min(self.candidates * widen, dist.shape[1])
+        if candidates < dist.shape[1]:
+            nearest = np.argpartition(dist, candidates - 1, axis=1)[:, :candidates]
+        else:
+            nearest = np.broadcast_to(np.arange(candidates), dist.shape)
+        return [np.concatenate([self._rows[i] for i in labels]) for labels in nearest]
@@ -0,0 +1,77 @@
+import numpy as np
+import cv2 as cv
+
+
+def faceQuality(
+    rgbFrame: np.ndarray,
+    box: tuple,
+    landmarks: dict | None = None,
+    minSize: int = 36,
+    goodSize: int = 80,
+    goodSharpness: float = 100.0,
+    maxYaw: float = 0.6,
+) -> float:
+    # geometric mean of size, sharpness, brightness and pose scores in [0, 1],
+    # any one of them at zero rejects the face
+    top, right, bottom, left = box
+    size = min(bottom - top, right - left)
+    if size < minSize:
+        return 0.0
+    crop = rgbFrame[max(top, 0) : bottom, max(left, 0) : right]
+    if crop.size == 0:
+        return 0.0
+
+    gray = cv.resize(cv.cvtColor(crop, cv.COLOR_RGB2GRAY), (64, 64))
+    scores = [
+        min(size / goodSize, 1.0),
+        min(cv.Laplacian(gray, cv.CV_64F).var() / goodSharpness, 1.0),
+        max(1.0 - abs(gray.mean() - 128) / 96, 0.0),
+    ]
+
+    # yaw from how far the nose sits off the midpoint between the eyes
+    if landmarks:
+        leftEye = np.mean(landmarks["left_eye"], axis=0)
+        rightEye = np.mean(landmarks["right_eye"], axis=0)
+        nose = np.mean(landmarks["nose_tip"], axis=0)
+        eyes = np.linalg.norm(rightEye - leftEye)
+        yaw = abs(nose[0] - (leftEye[0] + rightEye[0]) / 2) / max(eyes, 1e-6)
+        scores.append(max(1.0 - yaw / maxYaw, 0.0))
+
+    return float(np.prod(scores) ** (1 / len(scores)))
+
+
+def scoreFaces(rgbFrame: np.ndarray, face_locations: list) -> list:
+    import face_recognition as fr
+
+    if not face_locations:
+        return []
+    landmarks = fr.face_landmarks(rgbFrame, face_locations, model="small")
+    return [
+        faceQuality(rgbFrame, box, marks)
+        for box, marks in zip(face_locations, landmarks)
+    ]
+
+
+def pickSamples(
+    face_encodings: list,
+    scores: list,
+    existing: list,
+    limit: int,
+    minQuality: float = 0.5,
+    minDistance: float = 0.15,
+) -> list:
+    # best samples first, anything too close to a stored or already picked
+    # encoding of the same person adds nothing and is left out
+    picked = []
+    kept = [np.asarray(e, dtype=np.float64) for e in existing]
+    for i in np.argsort(scores)[::-1]:
+        if (len(picked) >= limit) or (scores[i] < minQuality):
+            break
+        encoding = np.asarray(face_encodings[i], dtype=np.float64)
+        if kept and (
+            np.linalg.norm(np.array(kept) - encoding, axis=1).min() < minDistance
+        ):
+            continue
+        picked.append(int(i))
+        kept.append(encoding)
+    return picked
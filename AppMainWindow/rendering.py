@@ -0,0 +1,120 @@
+from PyQt6.QtWidgets import QLabel
+from PyQt6.QtGui import QImage, QPainter, QPen, QColor, QFont
+from PyQt6.QtCore import QRect
+import numpy as np
+import cv2 as cv
+
+from .detection import fitSize, resizeFrame
+from .metrics import Metrics
+
+
+def bgrImage(img: np.ndarray) -> QImage:
+    # wraps the pixels as they are, the array has to outlive the image
+    height, width = img.shape[:2]
+    return QImage(img.data, width, height, img.strides[0], QImage.Format.Format_BGR888)
+
+
+class FrameRing:
+    # display-sized frames are resized into a few reused buffers, so the one
+    # that is on screen is never the one being written
+    def __init__(self, size: int = 3) -> None:
+        self.buffers = [None] * size
+        self.index = 0
+
+    def resize(self, img: cv.Mat, screenSize: tuple[int, int]) -> np.ndarray:
+        wn, hn = fitSize(img, screenSize)
+        self.index = (self.index + 1) % len(self.buffers)
+        buffer = self.buffers[self.index]
+        if (buffer is None) or (buffer.shape != (hn, wn, 3)):
+            buffer = self.buffers[self.index] = np.empty((hn, wn, 3), np.uint8)
+        return resizeFrame(img, screenSize, buffer)
+
+
+def paintFaces(
+    painter: QPainter, face_locations: list, face_names: list, scale: float = 1.0
+) -> None:
+    scale = 1 / scale
+    painter.setFont(QFont("Helvetica", 10))
+    for (top, right, bottom, left), name in zip(face_locations, face_names):
+        top, right = int(top * scale), int(right * scale)
+        bottom, left = int(bottom * scale), int(left * scale)
+
+        painter.setPen(QPen(QColor(255, 0, 0), 2))
+        painter.drawRect(left, top, right - left, bottom - top)
+        painter.fillRect(
+            QRect(left - 1, bottom - 15, right - left + 2, 20), QColor(255, 0, 0)
+        )
+        painter.setPen(QColor(255, 255, 255))
+        painter.drawText(left + 2, bottom, name)
+
+
+def paintLines(painter: QPainter, lines: list) -> None:
+    if not lines:
+        return
+    painter.setFont(QFont("Monospace", 8))
+    height = painter.fontMetrics().height()
+    width = max(painter.fontMetrics().horizontalAdvance(line) for line in lines)
+    painter.fillRect(
+        QRect(2, 2, width + 8, height * len(lines) + 6), QColor(0, 0, 0, 160)
+    )
+    painter.setPen(QColor(0, 255, 0))
+    for i, line in enumerate(lines):
+        painter.drawText(
+            6, 4 + height * (i + 1) - painter.fontMetrics().descent(), line
+        )
+
+
+class FrameView:
+    # paints a BGR frame plus its overlays straight onto a QLabel, nothing is
+    # drawn into the pixels and no QPixmap is made per frame
+    def __init__(self, label: QLabel, metrics: Metrics | None = None) -> None:
+        self.label = label
+        self.metrics = metrics or Metrics()
+        self.frame = None
+        self.image = None
+        self.face_locations = []
+        self.face_names = []
+        self.scale = 1.0
+        self.lines = []
+        label.paintEvent = self.paintEvent
+
+    def setFrame(
+        self,
+        frame: np.ndarray,
+        face_locations: list | None = None,
+        face_names: list | None = None,
+        scale: float = 1.0,
+        lines: list | None = None,
+    ) -> None:
+        self.frame = frame
+        self.image = bgrImage(frame)
+        self.face_locations = face_locations or []
+        self.face_names = face_names or []
+        self.scale = scale
+        self.lines = lines or []
+        self.label.update()
+
+    def clear(self) -> None:
+        self.frame = None
+        self.image = None
+        self.label.clear()
+
+    def origin(self) -> tuple[int, int]:
+        # same centring as AlignCenter on a pixmap
+        return (
+            (self.label.width() - self.image.width()) // 2,
+            (self.label.height() - self.image.height()) // 2,
+        )
+
+    def paintEvent(self, ev) -> None:
+        QLabel.paintEvent(self.label, ev)
+        if self.image is None:
+            return
+        with self.metrics.time("paint"):
+            painter = QPainter(self.label)
+            painter.translate(*self.origin())
+            painter.drawImage(0, 0, self.image)
+            paintFaces(painter, self.face_locations, self.face_names, self.scale)
+            painter.resetTransform()
+            paintLines(painter, self.lines)
+            painter.end()
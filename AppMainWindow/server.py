@@ -0,0 +1,120 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import ThreadingMixIn, UnixStreamServer
+from urllib.parse import urlparse, parse_qs
+import numpy as np
+import json
+import os
+import cv2 as cv
+
+from .engine import FaceEngine
+
+
+class UnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+
+def makeHandler(engine: FaceEngine):
+    class Handler(BaseHTTPRequestHandler):
+        # POST /recognize?scale=1.0   body: encoded image
+        # POST /enroll?name=Alice      body: encoded image with exactly one face
+        # POST /delete                 body: {"ids": [1, 2, 3]}
+        # GET  /metrics
+        protocol_version = "HTTP/1.1"
+
+        def _reply(self, status: int, body: bytes, contentType: str) -> None:
+            self.send_response(status)
+            self.send_header("Content-Type", contentType)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _json(self, status: int, value: dict) -> None:
+            self._reply(status, json.dumps(value).encode(), "application/json")
+
+        def _body(self) -> bytes:
+            return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+        def _image(self) -> np.ndarray | None:
+            data = np.frombuffer(self._body(), np.uint8)
+            return cv.imdecode(data, cv.IMREAD_COLOR) if data.size else None
+
+        def do_GET(self) -> None:
+            if urlparse(self.path).path != "/metrics":
+                self._json(404, {"error": "not found"})
+                return
+            body = engine.metrics.prometheusText().encode()
+            self._reply(200, body, "text/plain; version=0.0.4")
+
+        def do_POST(self) -> None:
+            url = urlparse(self.path)
+            query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            routes = {
+                "/recognize": self.recognize,
+                "/enroll": self.enroll,
+                "/delete": self.delete,
+            }
+            if url.path not in routes:
+                self._json(404, {"error": "not found"})
+                return
+            try:
+                with engine.metrics.time(url.path[1:]):
+                    routes[url.path](query)
+            except (KeyError, ValueError, TypeError) as e:
+                self._json(400, {"error": str(e)})
+            except Exception as e:
+                # anything else still gets an answer, not a dropped connection
+                self._json(500, {"error": f"{type(e).__name__}: {e}"})
+
+        def recognize(self, query: dict) -> None:
+            img = self._image()
+            if img is None:
+                raise ValueError("body is not an image")
+            face_locations, _, face_names, scores = engine.recognize(
+                img, float(query.get("scale", 1.0))
+            )
+            faces = [
+                {"box": list(box), "name": name, "quality": round(score, 3)}
+                for box, name, score in zip(face_locations, face_names, scores)
+            ]
+            self._json(200, {"faces": faces})
+
+        def enroll(self, query: dict) -> None:
+            img = self._image()
+            if img is None:
+                raise ValueError("body is not an image")
+            _, face_encodings, scores = engine.detect(
+                img, float(query.get("scale", 1.0))
+            )
+            if len(face_encodings) != 1:
+                raise ValueError(f"expected one face, found {len(face_encodings)}")
+            if scores[0] < engine.enrollQuality:
+                raise ValueError(f"face quality {scores[0]:.2f} is too low")
+            ids = engine.enroll([query["name"]], face_encodings)
+            if not ids:
+                self._json(409, {"error": "near-duplicate of a stored sample"})
+                return
+            self._json(200, {"id": ids[0]})
+
+        def delete(self, query: dict) -> None:
+            ids = [int(id) for id in json.loads(self._body())["ids"]]
+            engine.delete(ids)
+            self._json(200, {"deleted": len(ids)})
+
+        def log_message(self, format: str, *args) -> None:
+            pass
+
+    return Handler
+
+
+def makeServer(
+    engine: FaceEngine,
+    port: int = 8000,
+    host: str = "127.0.0.1",
+    socketPath: str | None = None,
+):
+    # every request gets a thread, concurrent recognize calls meet in the batcher
+    if socketPath is None:
+        return ThreadingHTTPServer((host, port), makeHandler(engine))
+    if os.path.exists(socketPath):
+        os.remove(socketPath)
+    return UnixHTTPServer(socketPath, makeHandler(engine))
@@ -0,0 +1,319 @@
+from typing import Callable, Iterable
+from threading import RLock
+import multiprocessing as mp
+import traceback
+import json
+import os
+import numpy as np
+
+from .gallery import FaceGallery
+from .annindex import IVFIndex
+from .prototypes import PrototypeIndex
+from .snapshot import loadSnapshot, saveSnapshot
+
+
+def _handle(gallery: FaceGallery, staged: list, command: str, args: tuple):
+    if command == "load":
+        gallery.load(
+            row
+            for ids, names, encodings in staged
+            for row in zip(ids, names, encodings)
+        )
+        staged.clear()
+        return len(gallery)
+    if command == "append":
+        return gallery.append(*args)
+    if command == "delete":
+        return gallery.delete(*args)
+    if command == "match":
+        return gallery.matchWithDistances(*args)
+    if command == "search":
+        distances, rows = gallery.search(*args)
+        with gallery.lock:
+            return (distances, gallery.ids[rows], gallery.names[rows])
+    if command == "len":
+        return len(gallery)
+    if command == "training":
+        return gallery.training
+    if command == "ids":
+        return gallery.ids.copy()
+    if command == "count":
+        return gallery.count(*args)
+    if command == "encodingsOf":
+        return gallery.encodingsOf(*args)
+    if command == "saveSnapshot":
+        saveSnapshot(args[0], gallery, args[1])
+        with gallery.lock:
+            return (len(gallery), int(gallery.ids.max()) if len(gallery) else 0)
+    if command == "loadSnapshot":
+        path, version, count = args
+        snapshot = loadSnapshot(path, version)
+        if (snapshot is None) or (len(snapshot[1]) != count):
+            return None
+        maxId, ids, names, encodings, sqnorms, indexState = snapshot
+        gallery.attach(ids, names, encodings, sqnorms, indexState)
+        return maxId
+    raise ValueError(f"unknown shard command {command}")
+
+
+def _serve(conn, dim: int, dtype: type, prototypes: str | None, nprobe: int) -> None:
+    # runs in a shard process: one FaceGallery answering requests on the pipe.
+    # Staged rows are sent without a reply and loaded together by "load"
+    index = PrototypeIndex(prototypes) if prototypes else IVFIndex(nprobe=nprobe)
+    gallery = FaceGallery(dim, index=index, dtype=dtype)
+    staged = []
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            # the parent went away without closing
+            break
+        if request is None:
+            break
+        command, args = request[0], request[1:]
+        if command == "stage":
+            staged.append(args)
+            continue
+        try:
+            result = _handle(gallery, staged, command, args)
+        except Exception:
+            conn.send((False, traceback.format_exc()))
+        else:
+            conn.send((True, result))
+    conn.close()
+
+
+class ShardedGallery:
+    # the gallery split by id over N shard processes, each with its own
+    # FaceGallery and index. Queries go to every shard and their best rows are
+    # merged, enrolled and deleted rows go to the shard owning the id (id % N).
+    # Each shard snapshots to its own directory and maps it back on load
+    def __init__(
+        self,
+        shards: int,
+        dim: int = 128,
+        dtype: type = np.float32,
+        prototypes: str | None = None,
+        stageSize: int = 10000,
+        nprobe: int = 8,
+    ) -> None:
+        self.dim = dim
+        self.dtype = dtype
+        self.stageSize = stageSize
+        # one request in flight per pipe, concurrent callers take turns
+        self.lock = RLock()
+        self.conns, self.processes = [], []
+        context = mp.get_context("spawn")
+        for _ in range(shards):
+            conn, child = context.Pipe()
+            process = context.Process(
+                target=_serve, args=(child, dim, dtype, prototypes, nprobe), daemon=True
+            )
+            process.start()
+            child.close()
+            self.conns.append(conn)
+            self.processes.append(process)
+
+    @property
+    def shards(self) -> int:
+        return len(self.conns)
+
+    def _gather(self, requests: dict) -> dict:
+        # sends every request before waiting, so the shards work in parallel.
+        # All replies are read even if one failed, the pipes stay in step
+        with self.lock:
+            for shard, request in requests.items():
+                self.conns[shard].send(request)
+            replies = {shard: self.conns[shard].recv() for shard in requests}
+        for shard, (ok, result) in replies.items():
+            if not ok:
+                raise RuntimeError(f"shard {shard} failed:\n{result}")
+        return {shard: result for shard, (_, result) in replies.items()}
+
+    def _broadcast(self, *request) -> list:
+        results = self._gather({shard: request for shard in range(self.shards)})
+        return [results[shard] for shard in range(self.shards)]
+
+    def _route(self, ids: list) -> dict:
+        # shard -> positions of its ids
+        owners = np.asarray(ids, dtype=np.int64) % self.shards
+        return {
+            int(shard): np.flatnonzero(owners == shard) for shard in np.unique(owners)
+        }
+
+    def __len__(self) -> int:
+        return sum(self._broadcast("len"))
+
+    @property
+    def ids(self) -> np.ndarray:
+        return np.concatenate(self._broadcast("ids"))
+
+    @property
+    def training(self) -> bool:
+        return any(self._broadcast("training"))
+
+    def load(self, rows: Iterable[tuple[int, str, np.ndarray]]) -> None:
+        # streams the rows to their shards in chunks, each shard builds its
+        # gallery and index once everything has arrived
+        buffers = [[] for _ in range(self.shards)]
+        with self.lock:
+            for row in rows:
+                shard = int(row[0]) % self.shards
+                buffers[shard].append(row)
+                if len(buffers[shard]) >= self.stageSize:
+                    self._stage(shard, buffers[shard])
+                    buffers[shard] = []
+            for shard, buffer in enumerate(buffers):
+                if buffer:
+                    self._stage(shard, buffer)
+            self._broadcast("load")
+
+    def _stage(self, shard: int, rows: list) -> None:
+        ids, names, encodings = zip(*rows)
+        self.conns[shard].send(
+            (
+                "stage",
+                np.array(ids, dtype=np.int64),
+                np.array(names, dtype=object),
+                np.array(encodings, dtype=self.dtype).reshape(-1, self.dim),
+            )
+        )
+
+    def append(self, ids: list, names: list, encodings: list) -> None:
+        if not ids:
+            return
+        ids, names = np.asarray(ids), np.asarray(names, dtype=object)
+        encodings = np.asarray(encodings).reshape(-1, self.dim)
+        self._gather(
+            {
+                shard: ("append", list(ids[rows]), list(names[rows]), encodings[rows])
+                for shard, rows in self._route(ids).items()
+            }
+        )
+
+    def delete(self, ids: list) -> None:
+        if not ids:
+            return
+        ids = np.asarray(ids)
+        self._gather(
+            {
+                shard: ("delete", list(ids[rows]))
+                for shard, rows in self._route(ids).items()
+            }
+        )
+
+    def count(self, name: str) -> int:
+        return sum(self._broadcast("count", name))
+
+    def encodingsOf(self, name: str) -> np.ndarray:
+        return np.vstack(self._broadcast("encodingsOf", name))
+
+    def search(
+        self, face_encodings: list, k: int = 1, exact: bool = False
+    ) -> tuple[np.ndarray, np.ndarray]:
+        # as FaceGallery.search, but returns ids: rows only mean something in a shard
+        queries = np.asarray(face_encodings, dtype=np.float64).reshape(-1, self.dim)
+        results = self._broadcast("search", queries, k, exact)
+        distances = np.hstack([distances for distances, _, _ in results])
+        ids = np.hstack([ids for _, ids, _ in results]).astype(np.int64)
+        order = np.argsort(distances, axis=1, kind="stable")[:, :k]
+        return (
+            np.take_along_axis(distances, order, axis=1),
+            np.take_along_axis(ids, order, axis=1),
+        )
+
+    def match(self, face_encodings: list, threshold: float = 0.4) -> list:
+        return self.matchWithDistances(face_encodings, threshold)[0]
+
+    def matchWithDistances(
+        self, face_encodings: list, threshold: float = 0.4
+    ) -> tuple[list, list]:
+        # every shard decides its own best row against the threshold, with its
+        # exact fallback for misses, the closest of them wins
+        if len(face_encodings) == 0:
+            return ([], [])
+        queries = np.asarray(face_encodings, dtype=np.float64).reshape(-1, self.dim)
+        results = self._broadcast("match", queries, threshold)
+        distances = np.array(
+            [
+                [np.inf if (d is None) else d for d in shardDistances]
+                for _, shardDistances in results
+            ]
+        ).reshape(self.shards, len(queries))
+        best = np.argmin(distances, axis=0)
+
+        face_names, face_distances = [], []
+        for i, shard in enumerate(best):
+            if np.isinf(distances[shard, i]):
+                face_names.append("Unknown")
+                face_distances.append(None)
+            else:
+                face_names.append(results[shard][0][i])
+                face_distances.append(float(distances[shard, i]))
+        return (face_names, face_distances)
+
+    def saveSnapshot(self, path: str, version: int, source: str | None = None) -> None:
+        # shards.json goes last and holds every shard's count, a crash in
+        # between leaves a shard that no longer matches it
+        os.makedirs(path, exist_ok=True)
+        saved = self._gather(
+            {
+                shard: ("saveSnapshot", os.path.join(path, f"shard-{shard}"), version)
+                for shard in range(self.shards)
+            }
+        )
+        tmp = os.path.join(path, "shards.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(
+                {
+                    "version": version,
+                    "shards": self.shards,
+                    "counts": [saved[shard][0] for shard in range(self.shards)],
+                    "max_id": max(maxId for _, maxId in saved.values()),
+                    "source": source,
+                },
+                f,
+            )
+        os.replace(tmp, os.path.join(path, "shards.json"))
+
+    def loadSnapshot(
+        self,
+        path: str,
+        version: int,
+        fingerprint: Callable[[int], str | None] | None = None,
+    ) -> int | None:
+        # the highest id in the snapshot, None if it is missing or stale
+        try:
+            with open(os.path.join(path, "shards.json")) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if (meta["version"] != version) or (meta["shards"] != self.shards):
+            return None
+        if fingerprint is not None:
+            source = fingerprint(meta.get("max_id", 0))
+            if (source is None) or (meta.get("source") != source):
+                return None
+
+        maxIds = self._gather(
+            {
+                shard: (
+                    "loadSnapshot",
+                    os.path.join(path, f"shard-{shard}"),
+                    version,
+                    meta["counts"][shard],
+                )
+                for shard in range(self.shards)
+            }
+        )
+        if any(maxId is None for maxId in maxIds.values()):
+            return None
+        return max(maxIds.values())
+
+    def close(self) -> None:
+        with self.lock:
+            for conn in self.conns:
+                conn.send(None)
+            for conn, process in zip(self.conns, self.processes):
+                process.join(5)
+                conn.close()
@@ -0,0 +1,84 @@
+from typing import Callable
+import json
+import os
+import numpy as np
+
+from .gallery import FaceGallery
+
+FILES = ("ids.npy", "names.npy", "encodings.npy", "sqnorms.npy")
+
+
+def _save(path: str, fileName: str, array: np.ndarray) -> None:
+    tmp = os.path.join(path, fileName + ".tmp")
+    with open(tmp, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp, os.path.join(path, fileName))
+
+
+def saveSnapshot(
+    path: str, gallery: FaceGallery, version: int, source: str | None = None
+) -> None:
+    # source is FaceStore.fingerprint of the rows the gallery was loaded from
+    os.makedirs(path, exist_ok=True)
+    with gallery.lock:
+        ids, names = gallery.ids, gallery.names
+        arrays = (ids, names.astype(str), gallery.encodings, gallery.sqnorms)
+        meta = {
+            "version": version,
+            "count": len(ids),
+            "max_id": int(ids.max()) if len(ids) else 0,
+            "source": source,
+            "index": None,
+        }
+        for fileName, array in zip(FILES, arrays):
+            _save(path, fileName, array)
+
+        # the trained index too, so loading it does not run k-means again
+        state = None if (gallery.index is None) else gallery.index.state()
+        if state is not None:
+            meta["index"] = {"key": gallery.index.stateKey, "arrays": list(state)}
+            for name, array in state.items():
+                _save(path, f"index-{name}.npy", array)
+
+    # meta goes last, a crash in between leaves a count that no longer matches
+    tmp = os.path.join(path, "meta.json.tmp")
+    with open(tmp, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp, os.path.join(path, "meta.json"))
+
+
+def loadSnapshot(
+    path: str, version: int, fingerprint: Callable[[int], str | None] | None = None
+) -> tuple | None:
+    # a snapshot whose source is not fingerprint(max_id) is from elsewhere
+    try:
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        arrays = [np.load(os.path.join(path, name), mmap_mode="r") for name in FILES]
+    except (OSError, ValueError):
+        return None
+
+    if (meta["version"] != version) or any(
+        len(array) != meta["count"] for array in arrays
+    ):
+        return None
+    if fingerprint is not None:
+        source = fingerprint(meta["max_id"])
+        if (source is None) or (meta.get("source") != source):
+            return None
+
+    indexState = None
+    if meta.get("index") is not None:
+        try:
+            indexState = (
+                meta["index"]["key"],
+                {
+                    name: np.load(
+                        os.path.join(path, f"index-{name}.npy"), mmap_mode="r"
+                    )
+                    for name in meta["index"]["arrays"]
+                },
+            )
+        except (OSError, ValueError):
+            pass
+    return (meta["max_id"], *arrays, indexState)
@@ -0,0 +1,307 @@
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Iterator
+from threading import Lock, BoundedSemaphore
+import sqlite3
+import os
+
+from .codec import encodeEncoding, decodeEncoding
+
+
+class FaceStore(ABC):
+    # rows are (id, name, encoding blob, version), see codec.FORMATS
+    placeholder = "%s"
+    # backend and database, None when a snapshot can not be tied to it
+    location = None
+
+    @abstractmethod
+    def prepare(self) -> None: ...
+
+    @abstractmethod
+    def cursor(self) -> Iterator: ...
+
+    def close(self) -> None:
+        pass
+
+    def migrate(self, version: int) -> None:
+        p = self.placeholder
+        with self.cursor() as cr:
+            cr.execute(
+                f"SELECT id, encoding, version FROM known_faces WHERE version <> {p}",
+                (version,),
+            )
+            val = [
+                (encodeEncoding(decodeEncoding(encoding, old), version), version, id)
+                for id, encoding, old in cr.fetchall()
+            ]
+            cr.executemany(
+                f"UPDATE known_faces SET encoding = {p}, version = {p} WHERE id = {p}",
+                val,
+            )
+
+    def iterRows(self, minId: int = 0, chunkSize: int = 10000) -> Iterator[list]:
+        # keyset pagination, no connection is held between chunks
+        p = self.placeholder
+        while True:
+            with self.cursor() as cr:
+                cr.execute(
+                    "SELECT id, name, encoding, version FROM known_faces "
+                    f"WHERE id > {p} ORDER BY id LIMIT {p}",
+                    (minId, chunkSize),
+                )
+                rows = cr.fetchall()
+            if not rows:
+                return
+            yield rows
+            minId = rows[-1][0]
+
+    def fingerprint(self, maxId: int) -> str | None:
+        # the database plus a checksum of the ids and formats up to maxId, a
+        # snapshot of another database or of rows since deleted or migrated
+        # does not match
+        if self.location is None:
+            return None
+        with self.cursor() as cr:
+            cr.execute(
+                "SELECT COUNT(*), COALESCE(SUM(id), 0), COALESCE(SUM(version), 0) "
+                f"FROM known_faces WHERE id <= {self.placeholder}",
+                (maxId,),
+            )
+            count, ids, versions = cr.fetchall()[0]
+        return f"{self.location} {count}:{ids}:{versions}"
+
+    def _nameFilter(self, search: str) -> tuple[str, tuple]:
+        # substring match on name, LIKE wildcards in the search are literal
+        if not search:
+            return ("", ())
+        pattern = search.replace("!", "!!").replace("%", "!%").replace("_", "!_")
+        return (f" AND name LIKE {self.placeholder} ESCAPE '!'", (f"%{pattern}%",))
+
+    def pageFaces(self, afterId: int = 0, limit: int = 200, search: str = "") -> list:
+        # (id, name) rows after afterId, keyset pagination like iterRows
+        p = self.placeholder
+        where, args = self._nameFilter(search)
+        with self.cursor() as cr:
+            cr.execute(
+                f"SELECT id, name FROM known_faces WHERE id > {p}{where} "
+                f"ORDER BY id LIMIT {p}",
+                (afterId, *args, limit),
+            )
+            return cr.fetchall()
+
+    def countFaces(self, search: str = "") -> tuple[int, int]:
+        # rows and distinct names matching the search
+        where, args = self._nameFilter(search)
+        with self.cursor() as cr:
+            cr.execute(
+                f"SELECT COUNT(*), COUNT(DISTINCT name) FROM known_faces WHERE 1 = 1{where}",
+                args,
+            )
+            return tuple(cr.fetchall()[0])
+
+    def countsOf(self, names: list) -> dict:
+        if not names:
+            return {}
+        marks = ", ".join([self.placeholder] * len(names))
+        with self.cursor() as cr:
+            cr.execute(
+                "SELECT name, COUNT(*) FROM known_faces "
+                f"WHERE name IN ({marks}) GROUP BY name",
+                list(names),
+            )
+            return dict(cr.fetchall())
+
+    def encodingsByName(self, name: str) -> list:
+        with self.cursor() as cr:
+            cr.execute(
+                "SELECT encoding, version FROM known_faces "
+                f"WHERE name = {self.placeholder}",
+                (name,),
+            )
+            return [
+                decodeEncoding(encoding, version) for encoding, version in cr.fetchall()
+            ]
+
+    def countByName(self) -> dict:
+        with self.cursor() as cr:
+            cr.execute("SELECT name, COUNT(*) FROM known_faces GROUP BY name")
+            return dict(cr.fetchall())
+
+    @property
+    def insertSql(self) -> str:
+        p = self.placeholder
+        return (
+            f"INSERT INTO known_faces (name, encoding, version) VALUES ({p}, {p}, {p})"
+        )
+
+    def insert(self, rows: list) -> list:
+        # (name, encoding blob, version) rows, returns their new ids
+        ids = []
+        with self.cursor() as cr:
+            for row in rows:
+                cr.execute(self.insertSql, row)
+                ids.append(cr.lastrowid)
+        return ids
+
+    def bulkInsert(self, rows: list) -> None:
+        with self.cursor() as cr:
+            cr.executemany(self.insertSql, rows)
+
+    def insertEvents(self, rows: list, chunkSize: int = 100) -> None:
+        # (ts, source, name, distance, top, right, bottom, left) rows, a
+        # multi-row INSERT per chunk and one transaction for all of them
+        marks = "(" + ", ".join([self.placeholder] * 8) + ")"
+        with self.cursor() as cr:
+            for i in range(0, len(rows), chunkSize):
+                chunk = rows[i : i + chunkSize]
+                cr.execute(
+                    "INSERT INTO recognition_events (ts, source, name, distance, "
+                    "box_top, box_right, box_bottom, box_left) VALUES "
+                    + ", ".join([marks] * len(chunk)),
+                    [value for row in chunk for value in row],
+                )
+
+    def pruneEvents(self, before: float, chunkSize: int = 10000) -> int:
+        # every event older than `before`, walked in id ranges to keep each
+        # lock short. Writers interleave, so a range can hold newer events too
+        # and ts still decides what goes
+        p = self.placeholder
+        with self.cursor() as cr:
+            cr.execute(
+                f"SELECT MIN(id), MAX(id) FROM recognition_events WHERE ts < {p}",
+                (before,),
+            )
+            first, last = cr.fetchall()[0]
+        if first is None:
+            return 0
+        deleted = 0
+        for start in range(first, last + 1, chunkSize):
+            with self.cursor() as cr:
+                cr.execute(
+                    "DELETE FROM recognition_events "
+                    f"WHERE id >= {p} AND id <= {p} AND ts < {p}",
+                    (start, min(start + chunkSize - 1, last), before),
+                )
+                deleted += cr.rowcount
+        return deleted
+
+    def delete(self, ids: list, chunkSize: int = 1000) -> None:
+        with self.cursor() as cr:
+            for i in range(0, len(ids), chunkSize):
+                chunk = ids[i : i + chunkSize]
+                marks = ", ".join([self.placeholder] * len(chunk))
+                cr.execute(f"DELETE FROM known_faces WHERE id IN ({marks})", chunk)
+
+
+class MySQLFaceStore(FaceStore):
+    # nothing connects here: prepare() creates the database and the pool on
+    # the thread that calls it, so the GUI thread never waits for the server
+    def __init__(
+        self,
+        host: str = "localhost",
+        user: str = "root",
+        password: str = "abcd1234",
+        database: str = "face_recognition_app",
+        poolSize: int = 4,
+    ) -> None:
+        self.host = host
+        self.user = user
+        self.password = password
+        self.database = database
+        self.poolSize = poolSize
+        self.location = f"mysql://{host}/{database}"
+        self.pool = None
+        self._connectLock = Lock()
+        # get_connection() fails at once on an empty pool, callers beyond
+        # poolSize (e.g. server threads) wait here for a connection instead
+        self._slots = BoundedSemaphore(poolSize)
+
+    def _connect(self, create: bool = False) -> None:
+        from mysql.connector import connect
+        from mysql.connector.pooling import MySQLConnectionPool
+
+        with self._connectLock:
+            if self.pool is not None:
+                return
+            if create:
+                db = connect(host=self.host, user=self.user, password=self.password)
+                db.cursor().execute(f"CREATE DATABASE IF NOT EXISTS {self.database}")
+                db.close()
+            self.pool = MySQLConnectionPool(
+                pool_size=self.poolSize,
+                host=self.host,
+                user=self.user,
+                password=self.password,
+                database=self.database,
+            )
+
+    @contextmanager
+    def cursor(self) -> Iterator:
+        if self.pool is None:
+            self._connect()
+        with self._slots:
+            db = self.pool.get_connection()
+            cr = db.cursor()
+            try:
+                yield cr
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+            finally:
+                cr.close()
+                db.close()
+
+    def prepare(self) -> None:
+        self._connect(create=True)
+        with self.cursor() as cr:
+            cr.execute(
+                "CREATE TABLE IF NOT EXISTS known_faces (id INT AUTO_INCREMENT PRIMARY KEY, name TEXT, encoding BLOB, version TINYINT NOT NULL DEFAULT 0)"
+            )
+            cr.execute("SHOW COLUMNS FROM known_faces LIKE 'version'")
+            if not cr.fetchall():
+                cr.execute(
+                    "ALTER TABLE known_faces ADD COLUMN version TINYINT NOT NULL DEFAULT 0"
+                )
+            cr.execute(
+                "CREATE TABLE IF NOT EXISTS recognition_events (id BIGINT AUTO_INCREMENT PRIMARY KEY, ts DOUBLE NOT NULL, source VARCHAR(255), name TEXT, distance FLOAT, box_top INT, box_right INT, box_bottom INT, box_left INT, INDEX (ts))"
+            )
+
+
+class SQLiteFaceStore(FaceStore):
+    placeholder = "?"
+
+    def __init__(self, path: str = ":memory:") -> None:
+        # one connection shared by the UI and the writer thread
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.lock = Lock()
+        if path != ":memory:":
+            self.location = "sqlite://" + os.path.abspath(path)
+
+    @contextmanager
+    def cursor(self) -> Iterator:
+        with self.lock:
+            cr = self.db.cursor()
+            try:
+                yield cr
+                self.db.commit()
+            except Exception:
+                self.db.rollback()
+                raise
+            finally:
+                cr.close()
+
+    def prepare(self) -> None:
+        with self.cursor() as cr:
+            cr.execute(
+                "CREATE TABLE IF NOT EXISTS known_faces (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT, encoding BLOB, version TINYINT NOT NULL DEFAULT 0)"
+            )
+            cr.execute(
+                "CREATE TABLE IF NOT EXISTS recognition_events (id INTEGER PRIMARY KEY AUTOINCREMENT, ts REAL NOT NULL, source TEXT, name TEXT, distance REAL, box_top INTEGER, box_right INTEGER, box_bottom INTEGER, box_left INTEGER)"
+            )
+            cr.execute(
+                "CREATE INDEX IF NOT EXISTS recognition_events_ts ON recognition_events (ts)"
+            )
+
+    def close(self) -> None:
+        self.db.close()
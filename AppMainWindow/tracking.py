@@ -0,0 +1,185 @@
+from itertools import count
+import numpy as np
+import cv2 as cv
+
+
+def boxIoU(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    # boxes are (top, right, bottom, left) rows, result is len(a) x len(b)
+    a, b = a[:, None, :], b[None, :, :]
+    h = np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0])
+    w = np.minimum(a[..., 1], b[..., 1]) - np.maximum(a[..., 3], b[..., 3])
+    inter = np.clip(h, 0, None) * np.clip(w, 0, None)
+    areaA = (a[..., 2] - a[..., 0]) * (a[..., 1] - a[..., 3])
+    areaB = (b[..., 2] - b[..., 0]) * (b[..., 1] - b[..., 3])
+    return inter / np.maximum(areaA + areaB - inter, 1e-9)
+
+
+class Track:
+    _ids = count(1)
+
+    def __init__(
+        self,
+        box: np.ndarray,
+        encoding: np.ndarray,
+        name: str,
+        distance: float | None = None,
+    ) -> None:
+        self.id = next(Track._ids)
+        self.box = box
+        self.encoding = encoding
+        self.name = name
+        self.distance = distance
+        self.anchorBox = box.copy()
+        self.points = None
+        self.confidence = 1.0
+
+    def recognized(
+        self, encoding: np.ndarray, name: str, distance: float | None = None
+    ) -> None:
+        self.encoding = encoding
+        self.name = name
+        self.distance = distance
+        self.anchorBox = self.box.copy()
+        self.confidence = 1.0
+
+
+class FaceTracker:
+    # boxes are kept in raw frame coordinates so a change of the detection
+    # scale does not invalidate them, optical flow runs on the scaled frame
+
+    def __init__(
+        self,
+        detectEvery: int = 5,
+        minPoints: int = 5,
+        minConfidence: float = 0.6,
+        minAnchorIoU: float = 0.5,
+        matchIoU: float = 0.3,
+    ) -> None:
+        self.detectEvery = detectEvery
+        self.minPoints = minPoints
+        self.minConfidence = minConfidence
+        self.minAnchorIoU = minAnchorIoU
+        self.matchIoU = matchIoU
+
+        self.tracks = []
+        self.reset()
+
+    def reset(self) -> None:
+        self.tracks.clear()
+        self._gray = None
+        self._scale = None
+        self._sinceDetection = 0
+        self._lost = False
+
+    def needsDetection(self, scale: float) -> bool:
+        return (
+            (self._gray is None)
+            or (scale != self._scale)
+            or self._lost
+            or (self._sinceDetection >= self.detectEvery - 1)
+        )
+
+    def locations(self, scale: float, tracks: list | None = None) -> list:
+        tracks = self.tracks if tracks is None else tracks
+        return [tuple(int(v) for v in np.round(track.box * scale)) for track in tracks]
+
+    def _seed(self, track: Track, gray: np.ndarray, scale: float) -> None:
+        top, right, bottom, left = np.round(track.box * scale).astype(int)
+        mask = np.zeros_like(gray)
+        mask[max(top, 0) : max(bottom, 0), max(left, 0) : max(right, 0)] = 255
+        track.points = cv.goodFeaturesToTrack(
+            gray, 30, 0.01, 3, mask=mask, useHarrisDetector=False
+        )
+
+    def update(
+        self,
+        gray: np.ndarray,
+        scale: float,
+        face_locations: list,
+        face_encodings: list,
+        face_names: list,
+        face_distances: list | None = None,
+    ) -> None:
+        boxes = np.array(face_locations, dtype=np.float64).reshape(-1, 4) / scale
+        if face_distances is None:
+            face_distances = [None] * len(boxes)
+        tracks = []
+
+        if self.tracks and len(boxes):
+            iou = boxIoU(np.array([track.box for track in self.tracks]), boxes)
+            while True:
+                t, d = np.unravel_index(np.argmax(iou), iou.shape)
+                if iou[t, d] < self.matchIoU:
+                    break
+                iou[t, :], iou[:, d] = -1, -1
+                track = self.tracks[t]
+                track.box = boxes[d]
+                # a face skipped by the quality gate keeps its earlier identity
+                if face_encodings[d] is not None:
+                    track.recognized(
+                        face_encodings[d], face_names[d], face_distances[d]
+                    )
+                tracks.append((d, track))
+
+        matched = {d for d, _ in tracks}
+        for d, box in enumerate(boxes):
+            if d not in matched:
+                track = Track(box, face_encodings[d], face_names[d], face_distances[d])
+                tracks.append((d, track))
+
+        # keep the detector's order so results line up with its output
+        self.tracks = [track for _, track in sorted(tracks, key=lambda x: x[0])]
+        for track in self.tracks:
+            self._seed(track, gray, scale)
+
+        self._gray, self._scale = gray, scale
+        self._sinceDetection = 0
+        self._lost = False
+
+    def propagate(self, gray: np.ndarray) -> list:
+        scale = self._scale
+        survivors, stale = [], []
+
+        for track in self.tracks:
+            if (track.points is None) or (len(track.points) < self.minPoints):
+                self._lost = True
+                continue
+
+            points, status, _ = cv.calcOpticalFlowPyrLK(
+                self._gray, gray, track.points, None
+            )
+            good = status.ravel() == 1
+            if np.count_nonzero(good) < self.minPoints:
+                self._lost = True
+                continue
+
+            old, new = track.points[good, 0], points[good, 0]
+            shift = np.median(new - old, axis=0) / scale
+            spreadOld = np.linalg.norm(old - old.mean(axis=0), axis=1).mean()
+            spreadNew = np.linalg.norm(new - new.mean(axis=0), axis=1).mean()
+            zoom = spreadNew / spreadOld if spreadOld > 1e-6 else 1.0
+
+            top, right, bottom, left = track.box
+            cy, cx = (top + bottom) / 2 + shift[1], (left + right) / 2 + shift[0]
+            hh, hw = zoom * (bottom - top) / 2, zoom * (right - left) / 2
+            track.box = np.array([cy - hh, cx + hw, cy + hh, cx - hw])
+            track.points = new.reshape(-1, 1, 2)
+            track.confidence *= np.count_nonzero(good) / len(good)
+
+            anchorIoU = boxIoU(track.box[None], track.anchorBox[None])[0, 0]
+            if (
+                (track.encoding is None)
+                or (track.confidence < self.minConfidence)
+                or (anchorIoU < self.minAnchorIoU)
+            ):
+                stale.append(track)
+            survivors.append(track)
+
+        self.tracks = survivors
+        self._gray = gray
+        self._sinceDetection += 1
+        return stale
+
+    def reseed(self, tracks: list) -> None:
+        for track in tracks:
+            self._seed(track, self._gray, self._scale)
@@ -0,0 +1,222 @@
+import numpy as np
+import cv2 as cv
+
+from .detection import prepareFrame
+from .quality import scoreFaces
+from .tracking import boxIoU
+from .gallery import FaceGallery
+
+
+class Appearance:
+    # one face followed through the sampled frames, keeps its best encodings
+
+    def __init__(self, frame: int, box: np.ndarray, maxSamples: int = 5) -> None:
+        self.first = self.last = frame
+        self.firstBox = self.box = box
+        self.maxSamples = maxSamples
+        self.samples = []
+        # first and latest encodings, to tell people apart in the same spot
+        self.firstEncoding = self.encoding = None
+
+    def add(
+        self, frame: int, box: np.ndarray, encoding: np.ndarray | None, score: float
+    ) -> None:
+        self.last, self.box = frame, box
+        if encoding is not None:
+            self.encoding = np.asarray(encoding, dtype=np.float32)
+            if self.firstEncoding is None:
+                self.firstEncoding = self.encoding
+            self.samples.append((score, self.encoding))
+            self._trim()
+
+    def extend(self, other: "Appearance") -> None:
+        self.last, self.box = other.last, other.box
+        if other.encoding is not None:
+            self.encoding = other.encoding
+        self.samples.extend(other.samples)
+        self._trim()
+
+    def _trim(self) -> None:
+        if len(self.samples) > self.maxSamples:
+            self.samples.sort(key=lambda sample: sample[0], reverse=True)
+            del self.samples[self.maxSamples :]
+
+
+def splitSegments(frameCount: int, segments: int, stride: int = 1) -> list:
+    # [start, stop) ranges starting on sampled frames
+    size = -(-frameCount // max(segments, 1))
+    size = max(-(-size // stride) * stride, stride)
+    return [
+        (start, min(start + size, frameCount)) for start in range(0, frameCount, size)
+    ]
+
+
+def _follow(
+    appearances: list,
+    boxes: np.ndarray,
+    face_encodings: list,
+    matchIoU: float,
+    maxDistance: float,
+) -> list:
+    # greedy IoU assignment, returns the appearance for every box or None.
+    # A box whose encoding is far from the appearance's is someone else
+    assigned = [None] * len(boxes)
+    if not (appearances and len(boxes)):
+        return assigned
+    iou = boxIoU(np.array([a.box for a in appearances]), boxes)
+    for i, a in enumerate(appearances):
+        for d, encoding in enumerate(face_encodings):
+            if (a.encoding is not None) and (encoding is not None):
+                if np.linalg.norm(a.encoding - encoding) > maxDistance:
+                    iou[i, d] = -1
+    while True:
+        a, d = np.unravel_index(np.argmax(iou), iou.shape)
+        if iou[a, d] < matchIoU:
+            break
+        iou[a, :], iou[:, d] = -1, -1
+        assigned[d] = appearances[a]
+    return assigned
+
+
+def analyzeSegment(
+    fileName: str,
+    start: int,
+    stop: int,
+    stride: int = 1,
+    scale: float = 0.5,
+    minQuality: float = 0.3,
+    maxGap: int = 2,
+    matchIoU: float = 0.3,
+    maxDistance: float = 0.6,
+) -> list:
+    # runs in a worker process: decodes [start, stop), detects every stride-th
+    # frame and links faces from one sampled frame to the next by box overlap.
+    # Appearances unseen for more than maxGap sampled frames are closed
+    import face_recognition as fr
+
+    cam = cv.VideoCapture(fileName)
+    cam.set(cv.CAP_PROP_POS_FRAMES, start)
+    active, closed = [], []
+
+    for frame in range(start, stop):
+        if frame % stride:
+            if not cam.grab():
+                break
+            continue
+        ret, img = cam.read()
+        if not ret:
+            break
+
+        rgb = prepareFrame(img, scale)
+        face_locations = fr.face_locations(rgb)
+        scores = scoreFaces(rgb, face_locations)
+        good = [i for i, score in enumerate(scores) if score >= minQuality]
+        face_encodings = [None] * len(face_locations)
+        for i, encoding in zip(
+            good, fr.face_encodings(rgb, [face_locations[i] for i in good])
+        ):
+            face_encodings[i] = encoding
+
+        for a in [a for a in active if frame - a.last > maxGap * stride]:
+            active.remove(a)
+            closed.append(a)
+
+        boxes = np.array(face_locations, dtype=np.float64).reshape(-1, 4) / scale
+        assigned = _follow(active, boxes, face_encodings, matchIoU, maxDistance)
+        for d, box in enumerate(boxes):
+            if assigned[d] is None:
+                assigned[d] = Appearance(frame, box)
+                active.append(assigned[d])
+            assigned[d].add(frame, box, face_encodings[d], scores[d])
+
+    cam.release()
+    return sorted(closed + active, key=lambda a: a.first)
+
+
+def mergeSegments(
+    segments: list,
+    stride: int = 1,
+    maxGap: int = 2,
+    matchIoU: float = 0.3,
+    maxDistance: float = 0.6,
+) -> list:
+    # segments are (start, appearances). An appearance cut by a boundary is
+    # joined to the one starting after it by the same rule as within a segment
+    merged, tail = [], []
+    for start, appearances in segments:
+        tail = [a for a in tail if start - a.last <= maxGap * stride]
+        heads = [a for a in appearances if a.first - start < maxGap * stride]
+        boxes = np.array([a.firstBox for a in heads]).reshape(-1, 4)
+        face_encodings = [a.firstEncoding for a in heads]
+
+        continued = []
+        for head, previous in zip(
+            heads, _follow(tail, boxes, face_encodings, matchIoU, maxDistance)
+        ):
+            if (previous is not None) and (
+                head.first - previous.last <= maxGap * stride
+            ):
+                previous.extend(head)
+                continued.append(head)
+
+        fresh = [a for a in appearances if all(a is not c for c in continued)]
+        merged.extend(fresh)
+        tail = fresh + tail
+    return sorted(merged, key=lambda a: a.first)
+
+
+def buildTimeline(
+    appearances: list,
+    gallery: FaceGallery,
+    threshold: float = 0.4,
+    joinGap: int = 0,
+) -> list:
+    # (name, first frame, last frame, confidence, distance) per appearance.
+    # Every kept sample is matched, the name is the majority vote, confidence
+    # its share of the votes and distance the median over the voting samples.
+    # Appearances of the same known person less than joinGap frames apart
+    # are joined into one entry
+    samples = [encoding for a in appearances for _, encoding in a.samples]
+    face_names = gallery.match(samples, threshold)
+    distances, _ = gallery.search(samples, 1, True)
+    if distances.shape[1] == 0:
+        distances = np.full((len(samples), 1), np.inf)
+
+    entries, start = [], 0
+    for a in appearances:
+        names = face_names[start : start + len(a.samples)]
+        dist = distances[start : start + len(a.samples), 0]
+        start += len(a.samples)
+        if not names:
+            entries.append(["Unknown", a.first, a.last, 0.0, None, 0])
+            continue
+        values, counts = np.unique(names, return_counts=True)
+        name = values[np.argmax(counts)]
+        voted = dist[np.array(names) == name]
+        entries.append(
+            [
+                str(name),
+                a.first,
+                a.last,
+                counts.max() / len(names),
+                float(np.median(voted)) if np.isfinite(voted).all() else None,
+                len(names),
+            ]
+        )
+
+    timeline = []
+    for entry in sorted(entries, key=lambda e: e[1]):
+        previous = next(
+            (e for e in reversed(timeline) if e[0] == entry[0] != "Unknown"), None
+        )
+        if (previous is None) or (entry[1] - previous[2] > joinGap):
+            timeline.append(entry)
+            continue
+        # weighted by the number of samples behind each entry
+        n, m = previous[5], entry[5]
+        previous[2] = max(previous[2], entry[2])
+        previous[3] = (previous[3] * n + entry[3] * m) / (n + m)
+        if (previous[4] is not None) and (entry[4] is not None):
+            previous[4] = (previous[4] * n + entry[4] * m) / (n + m)
+        previous[5] = n + m
+    return [tuple(entry[:5]) for entry in timeline]
@@ -0,0 +1,134 @@
+"""
+python analyze.py recording.mp4 --sqlite faces.db --stride 5 --output timeline.json
+
+the video is cut into segments that are decoded and recognized in parallel,
+faces are followed across segment boundaries and the result is a timeline of
+who appeared when
+"""
+
+from AppMainWindow.codec import FORMATS
+from AppMainWindow.engine import FaceEngine
+from AppMainWindow.store import MySQLFaceStore, SQLiteFaceStore
+from AppMainWindow.video import (
+    analyzeSegment,
+    buildTimeline,
+    mergeSegments,
+    splitSegments,
+)
+
+from concurrent.futures import ProcessPoolExecutor
+from argparse import ArgumentParser
+from time import perf_counter
+import json
+import os
+import cv2 as cv
+
+
+def main() -> None:
+    parser = ArgumentParser(description="Who appears when in a recorded video")
+    parser.add_argument("video")
+    parser.add_argument("--sqlite", help="SQLite file to use instead of MySQL")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--user", default="root")
+    parser.add_argument("--password", default="abcd1234")
+    parser.add_argument("--format", choices=FORMATS, default="float32")
+    parser.add_argument("--snapshot-dir", help="gallery snapshot, as in the app")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument(
+        "--segments", type=int, default=None, help="default: 4 per worker"
+    )
+    parser.add_argument("--stride", type=int, default=5, help="detect every n-th frame")
+    parser.add_argument("--scale", type=float, default=0.5)
+    parser.add_argument("--min-quality", type=float, default=0.3)
+    parser.add_argument(
+        "--max-gap", type=int, default=2, help="sampled frames a face may be missed"
+    )
+    parser.add_argument(
+        "--join", type=float, default=2.0, help="seconds between joined appearances"
+    )
+    parser.add_argument("--output", help="write the timeline as JSON")
+    args = parser.parse_args()
+
+    cam = cv.VideoCapture(args.video)
+    if not cam.isOpened():
+        parser.error(f"cannot open {args.video}")
+    frameCount = int(cam.get(cv.CAP_PROP_FRAME_COUNT))
+    fps = cam.get(cv.CAP_PROP_FPS) or 25.0
+    cam.release()
+
+    if args.sqlite:
+        store = SQLiteFaceStore(args.sqlite)
+    else:
+        store = MySQLFaceStore(args.host, args.user, args.password)
+    # read-only: the gallery is loaded as stored, the schema is left alone
+    engine = FaceEngine(store, args.format, args.snapshot_dir)
+    engine.load()
+
+    ranges = splitSegments(frameCount, args.segments or 4 * args.workers, args.stride)
+    segments = [None] * len(ranges)
+    start = perf_counter()
+
+    with ProcessPoolExecutor(args.workers) as executor:
+        futures = {
+            executor.submit(
+                analyzeSegment,
+                args.video,
+                first,
+                stop,
+                args.stride,
+                args.scale,
+                args.min_quality,
+                args.max_gap,
+            ): i
+            for i, (first, stop) in enumerate(ranges)
+        }
+        done = 0
+        for future in futures:
+            i = futures[future]
+            segments[i] = (ranges[i][0], future.result())
+            done += ranges[i][1] - ranges[i][0]
+            rate = done / (perf_counter() - start)
+            print(f"{done}/{frameCount} frames, {rate:.0f} frames/s")
+
+    appearances = mergeSegments(segments, args.stride, args.max_gap)
+    timeline = buildTimeline(
+        appearances, engine.gallery, joinGap=round(args.join * fps)
+    )
+    engine.close()
+
+    elapsed = perf_counter() - start
+    print(
+        f"{frameCount} frames ({frameCount / fps:.0f}s of video) in {elapsed:.1f}s, "
+        f"{len(appearances)} appearances, {len(timeline)} timeline entries"
+    )
+    for name, first, last, confidence, distance in timeline:
+        print(
+            f"{first / fps:9.1f}s - {last / fps:9.1f}s  {name:20s} "
+            f"confidence {confidence:.2f}"
+        )
+
+    if args.output:
+        # one row per entry: name, start s, end s, confidence, median distance
+        report = {
+            "video": args.video,
+            "fps": fps,
+            "frames": frameCount,
+            "stride": args.stride,
+            "columns": ["name", "start", "end", "confidence", "distance"],
+            "timeline": [
+                [
+                    name,
+                    round(first / fps, 2),
+                    round(last / fps, 2),
+                    round(confidence, 3),
+                    None if distance is None else round(distance, 3),
+                ]
+                for name, first, last, confidence, distance in timeline
+            ],
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, separators=(",", ":"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+python -m benchmarks.ann --size 100000 --nprobe 4 8 16 32
+python -m benchmarks.ann --size 100000 --prototypes mean medoid kmeans
+"""
+
+from argparse import ArgumentParser
+from time import perf_counter
+import json
+
+from AppMainWindow.gallery import FaceGallery
+from AppMainWindow.annindex import IVFIndex
+from AppMainWindow.prototypes import PrototypeIndex
+from .synthetic import syntheticGallery, syntheticQueries, syntheticStrangers
+import numpy as np
+
+
+def timeSearch(gallery: FaceGallery, queries: np.ndarray, exact: bool) -> tuple:
+    indices, latencies = [], []
+    for query in queries:
+        start = perf_counter()
+        _, found = gallery.search([query], 1, exact)
+        latencies.append(perf_counter() - start)
+        indices.append(found[0, 0])
+    return (np.array(indices), np.array(latencies) * 1000)
+
+
+def timeMatch(gallery: FaceGallery, queries: np.ndarray) -> tuple:
+    # the recognition path, misses included: unknown faces get the fallback
+    face_names, latencies = [], []
+    for query in queries:
+        start = perf_counter()
+        face_names += gallery.match([query])
+        latencies.append(perf_counter() - start)
+    return (np.array(face_names), np.array(latencies) * 1000)
+
+
+def matchReport(
+    gallery: FaceGallery,
+    known: np.ndarray,
+    unknown: np.ndarray,
+    expected: np.ndarray | None = None,
+) -> tuple[dict, np.ndarray]:
+    # latencies for enrolled and unknown faces, names compared with `expected`
+    knownNames, knownLatencies = timeMatch(gallery, known)
+    unknownNames, unknownLatencies = timeMatch(gallery, unknown)
+    face_names = np.concatenate((knownNames, unknownNames))
+    if expected is None:
+        expected = face_names
+    report = {
+        "same_names": float(np.mean(face_names == expected)),
+        "known_p50_ms": round(float(np.percentile(knownLatencies, 50)), 3),
+        "unknown_p50_ms": round(float(np.percentile(unknownLatencies, 50)), 3),
+        "unknown_p99_ms": round(float(np.percentile(unknownLatencies, 99)), 3),
+    }
+    return (report, face_names)
+
+
+def main() -> None:
+    parser = ArgumentParser(
+        description="IVF index vs brute force on synthetic encodings"
+    )
+    parser.add_argument("--size", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--nlist", type=int, default=None)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 8, 16, 32])
+    parser.add_argument("--prototypes", nargs="*", default=[])
+    parser.add_argument("--candidates", type=int, default=4)
+    parser.add_argument(
+        "--fallback",
+        choices=["exact", "widen"],
+        default="exact",
+        help="how match() re-checks faces the index missed",
+    )
+    args = parser.parse_args()
+
+    ids, labels, encodings = syntheticGallery(args.size)
+    queries = syntheticQueries(args.queries, labels, encodings)
+    strangers = syntheticStrangers(args.queries)
+
+    index = IVFIndex(nlist=args.nlist, minSize=0)
+    gallery = FaceGallery(index=index, fallback=args.fallback)
+    start = perf_counter()
+    gallery.load(zip(ids, labels.astype(str), encodings))
+    buildTime = perf_counter() - start
+
+    exact, latencies = timeSearch(gallery, queries, True)
+    gallery.index = None
+    bruteMatch, expected = matchReport(gallery, queries, strangers)
+    gallery.index = index
+    report = {
+        "size": args.size,
+        "nlist": len(index.centroids),
+        "build_s": round(buildTime, 3),
+        "brute_force": {
+            "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+            "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+            "match": bruteMatch,
+        },
+        "ivf": [],
+    }
+
+    for nprobe in args.nprobe:
+        index.nprobe = nprobe
+        found, latencies = timeSearch(gallery, queries, False)
+        report["ivf"].append(
+            {
+                "nprobe": nprobe,
+                "recall@1": float(np.mean(found == exact)),
+                "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+                "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+                "match": matchReport(gallery, queries, strangers, expected)[0],
+            }
+        )
+
+    if args.prototypes:
+        report["prototypes"] = []
+    for kind in args.prototypes:
+        gallery.index = PrototypeIndex(kind, candidates=args.candidates, minSize=0)
+        start = perf_counter()
+        gallery.rebuildIndex()
+        buildTime = perf_counter() - start
+        found, latencies = timeSearch(gallery, queries, False)
+        report["prototypes"].append(
+            {
+                "kind": kind,
+                "build_s": round(buildTime, 3),
+                "recall@1": float(np.mean(found == exact)),
+                "same_name": float(np.mean(labels[found] == labels[exact])),
+                "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+                "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+                "match": matchReport(gallery, queries, strangers, expected)[0],
+            }
+        )
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
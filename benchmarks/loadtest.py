@@ -0,0 +1,106 @@
+"""
+python -m benchmarks.loadtest photo.jpg --url http://127.0.0.1:8000 --clients 16 --duration 30
+python -m benchmarks.loadtest photo.jpg --socket /tmp/faces.sock
+"""
+
+from http.client import HTTPConnection
+from concurrent.futures import ThreadPoolExecutor
+from argparse import ArgumentParser
+from urllib.parse import urlparse
+from time import perf_counter
+import numpy as np
+import socket
+import json
+
+
+class UnixHTTPConnection(HTTPConnection):
+    def __init__(self, path: str) -> None:
+        super().__init__("localhost")
+        self.path = path
+
+    def connect(self) -> None:
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.path)
+
+
+def percentiles(values: list) -> dict:
+    values = np.array(values) * 1000
+    return {
+        "mean_ms": round(float(values.mean()), 3),
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+    }
+
+
+def client(connect, body: bytes, path: str, until: float) -> tuple[list, int]:
+    # one keep-alive connection per client, requests back to back
+    conn = connect()
+    latencies, errors = [], 0
+    while perf_counter() < until:
+        start = perf_counter()
+        try:
+            conn.request("POST", path, body)
+            response = conn.getresponse()
+            response.read()
+            ok = response.status == 200
+        except OSError:
+            conn.close()
+            conn = connect()
+            ok = False
+        if ok:
+            latencies.append(perf_counter() - start)
+        else:
+            errors += 1
+    conn.close()
+    return (latencies, errors)
+
+
+def main() -> None:
+    parser = ArgumentParser(description="Load test the /recognize endpoint")
+    parser.add_argument("image")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--socket", help="Unix socket of serve.py --socket")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--scale", type=float, default=1.0)
+    parser.add_argument("--output", help="write the JSON report here")
+    args = parser.parse_args()
+
+    with open(args.image, "rb") as f:
+        body = f.read()
+    if args.socket:
+        connect = lambda: UnixHTTPConnection(args.socket)
+    else:
+        url = urlparse(args.url)
+        connect = lambda: HTTPConnection(url.hostname, url.port or 80)
+
+    start = perf_counter()
+    until = start + args.duration
+    path = f"/recognize?scale={args.scale}"
+    with ThreadPoolExecutor(args.clients) as executor:
+        results = list(
+            executor.map(
+                lambda _: client(connect, body, path, until), range(args.clients)
+            )
+        )
+    elapsed = perf_counter() - start
+
+    latencies = [latency for result, _ in results for latency in result]
+    report = {
+        "settings": vars(args),
+        "requests": len(latencies),
+        "errors": sum(errors for _, errors in results),
+        "requests_per_s": round(len(latencies) / elapsed, 2),
+        "latency": percentiles(latencies) if latencies else None,
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
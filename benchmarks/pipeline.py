@@ -0,0 +1,154 @@
+"""
+python -m benchmarks.pipeline video.mp4 --gallery 10000 --scale 0.7 --output run.json
+"""
+
+from argparse import ArgumentParser
+from time import perf_counter
+import json
+import sys
+
+from PyQt6.QtGui import QGuiApplication, QImage, QPainter
+from AppMainWindow.detection import prepareFrame, locateFaces, encodeFaces
+from AppMainWindow.rendering import FrameRing, bgrImage, paintFaces
+from AppMainWindow.gallery import FaceGallery
+from AppMainWindow.annindex import IVFIndex
+from AppMainWindow.codec import FORMATS, encodeEncoding, decodeEncoding
+from AppMainWindow.store import SQLiteFaceStore
+from .synthetic import syntheticGallery
+import numpy as np
+import cv2 as cv
+
+STAGES = ("resize", "prepare", "locate", "encode", "match", "paint")
+
+
+def peakRss() -> int | None:
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def loadGallery(size: int, encodingFormat: str, index: bool) -> tuple:
+    # goes through the same store -> gallery path as FaceEngine.load
+    version = FORMATS[encodingFormat]
+    store = SQLiteFaceStore()
+    store.prepare()
+    ids, labels, encodings = syntheticGallery(size)
+    store.bulkInsert(
+        [
+            (str(label), encodeEncoding(e, version), version)
+            for label, e in zip(labels, encodings)
+        ]
+    )
+
+    dtype = np.float64 if (encodingFormat == "float64") else np.float32
+    gallery = FaceGallery(index=IVFIndex() if index else None, dtype=dtype)
+    start = perf_counter()
+    gallery.load(
+        (id, name, decodeEncoding(encoding, version))
+        for rows in store.iterRows()
+        for id, name, encoding, version in rows
+    )
+    return (gallery, perf_counter() - start)
+
+
+def percentiles(values: list) -> dict:
+    values = np.array(values) * 1000
+    return {
+        "mean_ms": round(float(values.mean()), 3),
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+    }
+
+
+def run(
+    fileName: str, gallery: FaceGallery, screenSize: tuple, scale: float, frames: int
+) -> dict:
+    cam = cv.VideoCapture(fileName)
+    frameRing = FrameRing()
+    # stands in for the widget backing store that FrameView paints on
+    target = QImage(*screenSize, QImage.Format.Format_RGB32)
+    times = {stage: [] for stage in STAGES}
+    totals, faces = [], []
+
+    while (frames <= 0) or (len(totals) < frames):
+        ret, frame = cam.read()
+        if not ret:
+            break
+
+        t0 = perf_counter()
+        frame = frameRing.resize(frame, screenSize)
+        t1 = perf_counter()
+        rgbFrame = prepareFrame(frame, scale)
+        t2 = perf_counter()
+        face_locations = locateFaces(rgbFrame)
+        t3 = perf_counter()
+        face_encodings = encodeFaces(rgbFrame, face_locations)
+        t4 = perf_counter()
+        face_names = gallery.match(face_encodings)
+        t5 = perf_counter()
+        painter = QPainter(target)
+        painter.drawImage(0, 0, bgrImage(frame))
+        paintFaces(painter, face_locations, face_names, scale)
+        painter.end()
+        t6 = perf_counter()
+
+        marks = (t0, t1, t2, t3, t4, t5, t6)
+        for stage, begin, end in zip(STAGES, marks, marks[1:]):
+            times[stage].append(end - begin)
+        totals.append(t6 - t0)
+        faces.append(len(face_locations))
+    cam.release()
+
+    if not totals:
+        return {"file": fileName, "frames": 0}
+    return {
+        "file": fileName,
+        "frames": len(totals),
+        "fps": round(len(totals) / sum(totals), 2),
+        "faces_per_frame": round(float(np.mean(faces)), 2),
+        "total": percentiles(totals),
+        "stages": {stage: percentiles(times[stage]) for stage in STAGES},
+    }
+
+
+def main() -> None:
+    parser = ArgumentParser(description="Offline benchmark of the recognition path")
+    parser.add_argument("videos", nargs="+")
+    parser.add_argument("--gallery", type=int, default=1000)
+    parser.add_argument("--format", choices=FORMATS, default="float32")
+    parser.add_argument("--index", action="store_true", help="use the IVF index")
+    parser.add_argument("--scale", type=float, default=0.7)
+    parser.add_argument("--screen", default="781x511", help="display size WxH")
+    parser.add_argument("--frames", type=int, default=0, help="0 reads whole files")
+    parser.add_argument("--output", help="write the JSON report here")
+    args = parser.parse_args()
+
+    screenSize = tuple(int(v) for v in args.screen.split("x"))
+    # painting text needs a gui application, QT_QPA_PLATFORM=offscreen works headless
+    app = QGuiApplication(sys.argv[:1])
+    gallery, loadTime = loadGallery(args.gallery, args.format, args.index)
+
+    report = {
+        "settings": vars(args),
+        "gallery_size": len(gallery),
+        "gallery_load_s": round(loadTime, 3),
+        "runs": [
+            run(fileName, gallery, screenSize, args.scale, args.frames)
+            for fileName in args.videos
+        ],
+        "peak_rss_bytes": peakRss(),
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
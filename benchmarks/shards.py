@@ -0,0 +1,76 @@
+"""
+python -m benchmarks.shards --size 1000000 --shards 1 2 4 8
+"""
+
+from argparse import ArgumentParser
+from time import perf_counter
+import json
+
+from AppMainWindow.gallery import FaceGallery
+from AppMainWindow.annindex import IVFIndex
+from AppMainWindow.shards import ShardedGallery
+from .synthetic import syntheticGallery, syntheticQueries
+import numpy as np
+
+
+def timeMatch(gallery, queries: np.ndarray, batch: int) -> tuple:
+    # one call per batch, like the faces of one frame
+    face_names, latencies = [], []
+    for start in range(0, len(queries), batch):
+        begin = perf_counter()
+        face_names += gallery.match(queries[start : start + batch])
+        latencies.append(perf_counter() - begin)
+    return (face_names, np.array(latencies) * 1000)
+
+
+def main() -> None:
+    parser = ArgumentParser(description="sharded vs single-process matching")
+    parser.add_argument("--size", type=int, default=1000000)
+    parser.add_argument("--queries", type=int, default=400)
+    parser.add_argument("--batch", type=int, default=4, help="faces per frame")
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    ids, labels, encodings = syntheticGallery(args.size)
+    queries = syntheticQueries(args.queries, labels, encodings)
+    rows = list(zip(ids, labels.astype(str), encodings))
+
+    gallery = FaceGallery(index=IVFIndex(), dtype=np.float32)
+    start = perf_counter()
+    gallery.load(rows)
+    buildTime = perf_counter() - start
+    expected, latencies = timeMatch(gallery, queries, args.batch)
+    report = {
+        "size": args.size,
+        "batch": args.batch,
+        "single": {
+            "build_s": round(buildTime, 3),
+            "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+            "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+        },
+        "sharded": [],
+    }
+    del gallery
+
+    for shards in args.shards:
+        gallery = ShardedGallery(shards)
+        start = perf_counter()
+        gallery.load(rows)
+        buildTime = perf_counter() - start
+        face_names, latencies = timeMatch(gallery, queries, args.batch)
+        report["sharded"].append(
+            {
+                "shards": shards,
+                "build_s": round(buildTime, 3),
+                "same_names": float(np.mean(np.array(face_names) == expected)),
+                "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+                "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+            }
+        )
+        gallery.close()
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
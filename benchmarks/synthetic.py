@@ -0,0 +1,31 @@
+import numpy as np
+
+
+def syntheticGallery(
+    size: int, perIdentity: int = 5, dim: int = 128, seed: int = 0
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # identities sit ~0.9 apart and their samples ~0.2 apart,
+    # roughly like dlib encodings of different / same people
+    rng = np.random.default_rng(seed)
+    identities = max(size // perIdentity, 1)
+    centers = rng.normal(0, 0.65 / np.sqrt(dim), (identities, dim))
+
+    labels = np.arange(size) % identities
+    encodings = centers[labels] + rng.normal(0, 0.15 / np.sqrt(dim), (size, dim))
+    return (np.arange(1, size + 1), labels, encodings)
+
+
+def syntheticQueries(
+    size: int, labels: np.ndarray, encodings: np.ndarray, seed: int = 1
+) -> np.ndarray:
+    # fresh samples of enrolled identities, noise around an enrolled row
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(encodings), size)
+    dim = encodings.shape[1]
+    return encodings[rows] + rng.normal(0, 0.15 / np.sqrt(dim), (size, dim))
+
+
+def syntheticStrangers(size: int, dim: int = 128, seed: int = 2) -> np.ndarray:
+    # people who are not enrolled, drawn like syntheticGallery's identities
+    rng = np.random.default_rng(seed)
+    return rng.normal(0, 0.65 / np.sqrt(dim), (size, dim))
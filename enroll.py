@@ -0,0 +1,165 @@
+"""
+python enroll.py people/ --sqlite faces.db
+people/<name>/*.jpg, every image must contain exactly one face
+
+per name the sharpest, best lit, most frontal photos are kept, up to --limit
+and skipping near-duplicates of each other and of what is already stored.
+Detection results are cached by image content, importing the same photos
+again skips detection
+"""
+
+from AppMainWindow.cache import DetectionCache, fileKey
+from AppMainWindow.codec import FORMATS, encodeEncoding
+from AppMainWindow.detection import locateAndEncodeFile
+from AppMainWindow.quality import pickSamples
+from AppMainWindow.store import MySQLFaceStore, SQLiteFaceStore
+
+from concurrent.futures import ProcessPoolExecutor
+from argparse import ArgumentParser
+from time import perf_counter
+import os
+
+formats = (".jpeg", ".jpg", ".jp2", ".png", ".bmp", ".dib", ".webp")
+
+
+def listImages(root: str) -> list:
+    images = []
+    for name in sorted(os.listdir(root)):
+        folder = os.path.join(root, name)
+        if not os.path.isdir(folder):
+            continue
+        for fileName in sorted(os.listdir(folder)):
+            if fileName.lower().endswith(formats):
+                images.append((name, os.path.join(folder, fileName)))
+    return images
+
+
+def detectAll(executor, fileNames: list, maxSize: int, cache: DetectionCache | None):
+    # results in the order of fileNames, only cache misses reach the pool
+    if cache is None:
+        yield from executor.map(
+            locateAndEncodeFile, fileNames, [maxSize] * len(fileNames), chunksize=4
+        )
+        return
+    keys = [fileKey(fileName, "file", maxSize) for fileName in fileNames]
+    cached = [cache.get(key) for key in keys]
+    misses = [fileName for fileName, hit in zip(fileNames, cached) if hit is None]
+    print(f"{len(fileNames) - len(misses)}/{len(fileNames)} images in the cache")
+    computed = executor.map(
+        locateAndEncodeFile, misses, [maxSize] * len(misses), chunksize=4
+    )
+    for key, hit in zip(keys, cached):
+        if hit is None:
+            hit = next(computed)
+            cache.put(key, *hit)
+        yield hit
+
+
+def main() -> None:
+    parser = ArgumentParser(description="Enroll people/<name>/*.jpg into known_faces")
+    parser.add_argument("root")
+    parser.add_argument("--sqlite", help="SQLite file to use instead of MySQL")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--user", default="root")
+    parser.add_argument("--password", default="abcd1234")
+    parser.add_argument("--format", choices=FORMATS, default="float32")
+    parser.add_argument(
+        "--migrate",
+        action="store_true",
+        help="rewrite every stored encoding in --format first",
+    )
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--max-size", type=int, default=1000)
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--limit", type=int, default=10, help="encodings per name")
+    parser.add_argument("--min-quality", type=float, default=0.5)
+    parser.add_argument(
+        "--min-distance", type=float, default=0.15, help="closer samples are duplicates"
+    )
+    parser.add_argument(
+        "--cache",
+        default=os.path.expanduser("~/.face_recognition_app/detections.sqlite"),
+        help="detection cache file",
+    )
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument(
+        "--cache-size", type=int, default=256, help="cache size limit in MB"
+    )
+    args = parser.parse_args()
+
+    if args.sqlite:
+        store = SQLiteFaceStore(args.sqlite)
+    else:
+        store = MySQLFaceStore(args.host, args.user, args.password)
+    store.prepare()
+    version = FORMATS[args.format]
+    if args.migrate:
+        store.migrate(version)
+
+    cache = None
+    if not args.no_cache:
+        cache = DetectionCache(args.cache, args.cache_size << 20)
+
+    counts = store.countByName()
+    images = listImages(args.root)
+    names = [name for name, _ in images]
+    fileNames = [fileName for _, fileName in images]
+
+    enrolled, skipped, poor, dropped, rows = 0, 0, 0, 0, []
+    candidates = []
+    start = perf_counter()
+
+    def pick(name: str) -> None:
+        # images come grouped by name, so each person is decided in one go
+        nonlocal poor, dropped
+        existing = store.encodingsByName(name) if counts.get(name) else []
+        encodings = [encoding for encoding, _ in candidates]
+        scores = [score for _, score in candidates]
+        picked = pickSamples(
+            encodings,
+            scores,
+            existing,
+            args.limit - len(existing),
+            args.min_quality,
+            args.min_distance,
+        )
+        poor += sum(score < args.min_quality for score in scores)
+        dropped += len(candidates) - len(picked)
+        rows.extend(
+            (name, encodeEncoding(encodings[i], version), version) for i in picked
+        )
+        candidates.clear()
+
+    with ProcessPoolExecutor(args.workers) as executor:
+        results = detectAll(executor, fileNames, args.max_size, cache)
+        for i, (name, (_, face_encodings, scores)) in enumerate(zip(names, results), 1):
+            if len(face_encodings) != 1:
+                skipped += 1
+            else:
+                candidates.append((face_encodings[0], scores[0]))
+            if (i == len(names)) or (names[i] != name):
+                pick(name)
+
+            if len(rows) >= args.batch:
+                store.bulkInsert(rows)
+                enrolled += len(rows)
+                rows.clear()
+                rate = i / (perf_counter() - start)
+                print(f"{i}/{len(images)} images, {rate:.1f} images/s")
+
+    store.bulkInsert(rows)
+    enrolled += len(rows)
+    store.close()
+    if cache is not None:
+        cache.close()
+
+    elapsed = perf_counter() - start
+    print(
+        f"{len(images)} images in {elapsed:.1f}s ({len(images) / max(elapsed, 1e-9):.1f} images/s): "
+        f"{enrolled} enrolled, {skipped} without exactly one face, "
+        f"{poor} below the quality bar, {dropped - poor} duplicates or over the per-name limit"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,109 @@
+from time import perf_counter
+
+# startup is timed from here, before Qt and the app modules are imported
+startedAt = perf_counter()
+
 from PyQt6.QtWidgets import QApplication
 from AppMainWindow import AppMainWindow
+from AppMainWindow.store import SQLiteFaceStore
+from AppMainWindow.codec import FORMATS
+from argparse import ArgumentParser
 import sys
 
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
-    win = AppMainWindow()
+    parser = ArgumentParser()
+    parser.add_argument(
+        "sources",
+        nargs="*",
+        default=["0"],
+        help="camera indexes, video files or stream URLs, several show as a grid",
+    )
+    parser.add_argument("--sqlite", help="SQLite file to use instead of MySQL")
+    parser.add_argument("--format", choices=FORMATS, default="float32")
+    parser.add_argument(
+        "--migrate",
+        action="store_true",
+        help="rewrite every stored encoding in --format first",
+    )
+    parser.add_argument(
+        "--latency-budget",
+        type=float,
+        help="target detection time in ms, the detection scale adapts to it",
+    )
+    parser.add_argument(
+        "--upsample",
+        type=int,
+        nargs=2,
+        default=(0, 1),
+        metavar=("MIN", "MAX"),
+        help="upsampling range the latency budget may use",
+    )
+    parser.add_argument(
+        "--jitters",
+        type=int,
+        nargs=2,
+        default=(1, 1),
+        metavar=("MIN", "MAX"),
+        help="encoding jitters range the latency budget may use",
+    )
+    parser.add_argument(
+        "--detection-workers",
+        type=int,
+        help="detection processes shared by all cameras (default: one per core)",
+    )
+    parser.add_argument(
+        "--prototypes",
+        choices=("mean", "medoid", "kmeans"),
+        help="match against per-person prototypes first",
+    )
+    parser.add_argument(
+        "--nprobe",
+        type=int,
+        default=8,
+        help="index buckets searched per face, more is slower but misses less",
+    )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=0,
+        help="split the gallery over this many matching processes",
+    )
+    parser.add_argument(
+        "--no-event-log",
+        action="store_true",
+        help="do not record who was seen in recognition_events",
+    )
+    parser.add_argument(
+        "--event-retention",
+        type=float,
+        default=30,
+        help="days recognition events are kept",
+    )
+    parser.add_argument("--metrics-file", help="export metrics here every 10s")
+    parser.add_argument("--metrics-port", type=int, help="serve /metrics on this port")
+    args, qtArgs = parser.parse_known_args()
+
+    sources = [int(source) if source.isdigit() else source for source in args.sources]
+    store = SQLiteFaceStore(args.sqlite) if args.sqlite else None
+
+    app = QApplication(sys.argv[:1] + qtArgs)
+    win = AppMainWindow(
+        sources if (len(sources) > 1) else sources[0],
+        store=store,
+        encodingFormat=args.format,
+        migrate=args.migrate,
+        detectionWorkers=args.detection_workers,
+        prototypes=args.prototypes,
+        shards=args.shards,
+        nprobe=args.nprobe,
+        latencyBudget=args.latency_budget / 1000 if args.latency_budget else None,
+        upsample=tuple(args.upsample),
+        jitters=tuple(args.jitters),
+        metricsFile=args.metrics_file,
+        metricsPort=args.metrics_port,
+        eventLog=not args.no_event_log,
+        eventRetentionDays=args.event_retention,
+        startedAt=startedAt,
+    )
     win.show()
     sys.exit(app.exec())
@@ -0,0 +1,84 @@
+"""
+python serve.py --sqlite faces.db --port 8000
+python serve.py --sqlite faces.db --socket /tmp/faces.sock
+curl --data-binary @photo.jpg "http://127.0.0.1:8000/recognize"
+"""
+
+from AppMainWindow.codec import FORMATS
+from AppMainWindow.engine import FaceEngine
+from AppMainWindow.server import makeServer
+from AppMainWindow.store import MySQLFaceStore, SQLiteFaceStore
+
+from concurrent.futures import ProcessPoolExecutor
+from argparse import ArgumentParser
+import multiprocessing as mp
+import os
+
+
+def main() -> None:
+    parser = ArgumentParser(description="Serve recognize/enroll/delete over HTTP")
+    parser.add_argument("--sqlite", help="SQLite file to use instead of MySQL")
+    parser.add_argument("--host", default="localhost", help="MySQL host")
+    parser.add_argument("--user", default="root")
+    parser.add_argument("--password", default="abcd1234")
+    parser.add_argument("--format", choices=FORMATS, default="float32")
+    parser.add_argument(
+        "--migrate",
+        action="store_true",
+        help="rewrite every stored encoding in --format first",
+    )
+    parser.add_argument(
+        "--prototypes",
+        choices=("mean", "medoid", "kmeans"),
+        help="match against per-person prototypes first",
+    )
+    parser.add_argument(
+        "--nprobe",
+        type=int,
+        default=8,
+        help="index buckets searched per face, more is slower but misses less",
+    )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=0,
+        help="split the gallery over this many matching processes",
+    )
+    parser.add_argument("--snapshot-dir", help="gallery snapshot, as in the app")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--bind", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--socket", help="listen on this Unix socket instead")
+    args = parser.parse_args()
+
+    if args.sqlite:
+        store = SQLiteFaceStore(args.sqlite)
+    else:
+        store = MySQLFaceStore(args.host, args.user, args.password)
+
+    executor = ProcessPoolExecutor(args.workers, mp_context=mp.get_context("spawn"))
+    engine = FaceEngine(
+        store,
+        args.format,
+        args.snapshot_dir,
+        executor,
+        prototypes=args.prototypes,
+        shards=args.shards,
+        nprobe=args.nprobe,
+    )
+    engine.prepare(args.migrate)
+    server = makeServer(engine, args.port, args.bind, args.socket)
+    print(f"serving {len(engine.gallery)} encodings on {args.socket or args.port}")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        executor.shutdown(cancel_futures=True)
+        engine.close()
+
+
+if __name__ == "__main__":
+    main()